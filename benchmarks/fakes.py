@@ -0,0 +1,328 @@
+"""
+Локальные стенды внешних API для нагрузочного тестирования.
+
+FakeTelegram, FakePlane и FakeMattermost реализуют ровно ту часть API,
+которой пользуется бот, с настраиваемой задержкой ответа и долей ошибок.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+class FaultInjection:
+    """Задержка ответа (latency ± jitter секунд) и доля ответов с ошибкой 500"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"ok": False, "error_code": 500, "description": "Injected error"}, status=500)
+        return await handler(request)
+
+class FakeServer:
+    """Базовый класс: aiohttp-приложение на локальном порту"""
+
+    def __init__(self, faults: Optional[FaultInjection] = None):
+        self.faults = faults or FaultInjection()
+        self.app = web.Application(middlewares=[self.faults.middleware])
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+class FakeTelegram(FakeServer):
+    """
+    Стенд Bot API. Сообщения, отправленные ботом, складываются в очереди
+    по chat_id, откуда их забирает драйвер нагрузки.
+    """
+
+    def __init__(self, faults: Optional[FaultInjection] = None):
+        super().__init__(faults)
+        self.outbox: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._message_id = 0
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    def _message(self, chat_id: int, text: str, reply_markup: Any = None) -> Dict[str, Any]:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "SupportBot", "username": "support_bot"},
+            "text": text,
+        }
+        # В Message Telegram возвращает только inline-клавиатуру; обычная
+        # клавиатура (ReplyKeyboardMarkup) в ответ не попадает
+        if isinstance(reply_markup, dict) and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        return message
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        data = dict(await request.post())
+        for key, value in data.items():
+            if isinstance(value, str) and value[:1] in "{[":
+                try:
+                    data[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return data
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.match_info["method"].lower()
+        params = await self._params(request)
+
+        if method == "getme":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "SupportBot", "username": "support_bot"}
+        elif method in ("sendmessage", "editmessagetext"):
+            chat_id = int(params["chat_id"])
+            result = self._message(chat_id, params.get("text", ""), params.get("reply_markup"))
+            self.outbox[chat_id].put_nowait((time.perf_counter(), method, result))
+        else:
+            # setWebhook, deleteWebhook, answerCallbackQuery и т.п.
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def next_message(self, chat_id: int, timeout: float) -> Tuple[float, str, Dict[str, Any]]:
+        """Ждет следующее сообщение бота в чат"""
+        return await asyncio.wait_for(self.outbox[chat_id].get(), timeout=timeout)
+
+class FakePlane(FakeServer):
+    """Стенд API задач и комментариев Plane"""
+
+    def __init__(self, faults: Optional[FaultInjection] = None):
+        super().__init__(faults)
+        self.issues: Dict[str, Dict[str, Any]] = {}
+        self.comments: Dict[str, List[str]] = defaultdict(list)
+        base = "/api/v1/workspaces/{workspace}/projects/{project}/issues"
+        self.app.router.add_post(base + "/", self.create_issue)
+        self.app.router.add_post(base + "/{issue}/comments/", self.create_comment)
+        self.app.router.add_delete(base + "/{issue}/", self.delete_issue)
+
+    async def create_issue(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        data = await request.json()
+        issue_id = str(uuid.uuid4())
+        self.issues[issue_id] = data
+        return web.json_response({"id": issue_id, **data}, status=201)
+
+    async def create_comment(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        data = await request.json()
+        self.comments[request.match_info["issue"]].append(data["comment_html"])
+        return web.json_response({"id": str(uuid.uuid4()), **data}, status=201)
+
+    async def delete_issue(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.issues.pop(request.match_info["issue"], None)
+        return web.Response(status=204)
+
+class WebSocketSession:
+    """
+    Сессия WebSocket стенда Mattermost: свой счетчик seq и последние события.
+
+    Как и настоящий сервер, стенд хранит последние события сессии и после
+    переподключения с connection_id и sequence_number (номер следующего
+    ожидаемого события) досылает пропущенные.
+    """
+
+    # Размер очереди пропущенных событий (как dead queue сервера Mattermost)
+    KEEP_EVENTS = 128
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.next_seq = 0
+        self.events: List[Dict[str, Any]] = []
+        self.queue: Optional[asyncio.Queue] = None
+        self.transport: Optional[asyncio.BaseTransport] = None
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        event = {**event, "seq": self.next_seq}
+        self.next_seq += 1
+        self.events = self.events[-(self.KEEP_EVENTS - 1):] + [event]
+        if self.queue is not None:
+            self.queue.put_nowait(event)
+
+    def missed(self, sequence_number: int) -> Optional[List[Dict[str, Any]]]:
+        """События начиная с sequence_number или None, если их уже нет в очереди"""
+        if sequence_number > self.next_seq:
+            return None
+        if sequence_number < self.next_seq and (not self.events or self.events[0]["seq"] > sequence_number):
+            return None
+        return [event for event in self.events if event["seq"] >= sequence_number]
+
+class FakeMattermost(FakeServer):
+    """
+    Стенд API постов, пользователей и файлов Mattermost.
+
+    Запоминает треды тикетов по заголовку "### #<id тикета> ...", чтобы драйвер
+    мог отвечать в них от имени поддержки. Каждый новый пост рассылается
+    подключенным к /api/v4/websocket клиентам событием posted;
+    drop_websockets() обрывает соединения, чтобы проверить переподключение.
+    """
+
+    SUPPORT_USER_ID = "support-agent"
+
+    def __init__(self, faults: Optional[FaultInjection] = None):
+        super().__init__(faults)
+        self.posts: Dict[str, Dict[str, Any]] = {}
+        self.threads: Dict[int, str] = {}
+        self._thread_events: Dict[int, asyncio.Event] = defaultdict(asyncio.Event)
+        self.app.router.add_post("/api/v4/posts", self.create_post)
+        self.app.router.add_get("/api/v4/posts/{post_id}", self.get_post)
+        self.app.router.add_delete("/api/v4/posts/{post_id}", self.delete_post)
+        self.app.router.add_get("/api/v4/users/{user_id}", self.get_user)
+        self.app.router.add_post("/api/v4/files", self.upload_file)
+        self.app.router.add_get("/api/v4/websocket", self.websocket)
+        self.ws_sessions: Dict[str, WebSocketSession] = {}
+        self.ws_connects = 0
+        self.ws_resumes = 0
+
+    def add_post(self, channel_id: str, message: str, user_id: str, root_id: str = "") -> Dict[str, Any]:
+        post = {
+            "id": uuid.uuid4().hex[:26],
+            "channel_id": channel_id,
+            "message": message,
+            "user_id": user_id,
+            "root_id": root_id,
+            "create_at": int(time.time() * 1000),
+        }
+        self.posts[post["id"]] = post
+        for session in self.ws_sessions.values():
+            session.emit({
+                "event": "posted",
+                "data": {"post": json.dumps(post), "channel_id": channel_id},
+                "broadcast": {"channel_id": channel_id},
+            })
+        match = re.match(r"### #(\d+) ", message)
+        if match and not root_id:
+            ticket_id = int(match.group(1))
+            self.threads[ticket_id] = post["id"]
+            self._thread_events[ticket_id].set()
+        return post
+
+    async def wait_thread(self, ticket_id: int, timeout: float) -> str:
+        """Ждет, пока бот создаст тред для тикета"""
+        await asyncio.wait_for(self._thread_events[ticket_id].wait(), timeout=timeout)
+        return self.threads[ticket_id]
+
+    async def create_post(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        data = await request.json()
+        post = self.add_post(data["channel_id"], data["message"], "bot-user", data.get("root_id", ""))
+        return web.json_response(post, status=201)
+
+    async def get_post(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        post = self.posts.get(request.match_info["post_id"])
+        if not post:
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response(post)
+
+    async def delete_post(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.posts.pop(request.match_info["post_id"], None)
+        return web.json_response({"status": "OK"})
+
+    async def get_user(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        user_id = request.match_info["user_id"]
+        return web.json_response({"id": user_id, "username": user_id, "first_name": "Support", "last_name": "Agent"})
+
+    async def upload_file(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        reader = await request.multipart()
+        async for part in reader:
+            # Читаем поток до конца, не сохраняя содержимое
+            while await part.read_chunk():
+                pass
+        return web.json_response({"file_infos": [{"id": uuid.uuid4().hex[:26]}]}, status=201)
+
+    def _ws_session(self, query: Any) -> Tuple[WebSocketSession, List[Dict[str, Any]]]:
+        """Возобновляет сессию по connection_id и sequence_number или начинает новую"""
+        session = self.ws_sessions.get(query.get("connection_id", ""))
+        if session is not None and query.get("sequence_number", "").isdigit():
+            missed = session.missed(int(query["sequence_number"]))
+            if missed is not None:
+                self.ws_resumes += 1
+                return session, missed
+        session = WebSocketSession()
+        self.ws_sessions[session.id] = session
+        return session, []
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        self.requests += 1
+        self.ws_connects += 1
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        # Первым сообщением клиент присылает authentication_challenge
+        await ws.receive()
+
+        session, missed = self._ws_session(request.query)
+        session.queue = asyncio.Queue()
+        session.transport = request.transport
+        for event in missed:
+            session.queue.put_nowait(event)
+        session.emit({"event": "hello", "data": {"connection_id": session.id}})
+
+        # Чтение нужно, чтобы отвечать на ping клиента и заметить закрытие
+        reader = asyncio.create_task(self._ws_read(ws))
+        try:
+            while True:
+                getter = asyncio.create_task(session.queue.get())
+                done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                await ws.send_json(getter.result())
+        except (ConnectionError, RuntimeError):
+            pass
+        finally:
+            reader.cancel()
+            if session.transport is request.transport:
+                session.queue = None
+                session.transport = None
+        return ws
+
+    @staticmethod
+    async def _ws_read(ws: web.WebSocketResponse) -> None:
+        async for _ in ws:
+            pass
+
+    def drop_websockets(self) -> int:
+        """Обрывает все соединения WebSocket без закрывающего кадра (как при сбое сети)"""
+        dropped = 0
+        for session in self.ws_sessions.values():
+            if session.transport is not None:
+                session.transport.close()
+                session.queue = None
+                session.transport = None
+                dropped += 1
+        return dropped
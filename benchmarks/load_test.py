@@ -0,0 +1,333 @@
+"""
+Нагрузочный тест бота со стендами Telegram, Plane и Mattermost.
+
+Поднимает локальные стенды внешних API, запускает приложение бота в режиме
+Telegram webhook и прогоняет через него симулированных пользователей:
+регистрация, создание заявки, сообщения в заявку, затем ответы поддержки
+через вебхук Mattermost. В конце печатает p50/p95/p99 по каждому шагу
+и общую пропускную способность.
+
+Перед нагрузкой один пользователь проходит сценарий целиком (smoke-прогон):
+если он не дошел до конца, тест завершается с ошибкой, а не измеряет
+сценарий, который обрывается на первом шаге.
+
+С --ingestion websocket ответы поддержки приходят боту событиями posted
+через WebSocket стенда Mattermost. Smoke-прогон тогда еще и обрывает
+соединение и проверяет, что ответ, отправленный во время обрыва, дошел
+после переподключения с возобновлением сессии; --ws-drop-every обрывает
+соединения и во время нагрузки.
+
+Нужны PostgreSQL и Redis (docker-compose up) со схемой, приведенной
+к последней миграции. Настройки подключения берутся из .env.
+
+    python -m benchmarks.load_test --users 1000 --concurrency 100 --messages 3
+    python -m benchmarks.load_test --latency 0.2 --jitter 0.1 --error-rate 0.05
+    python -m benchmarks.load_test --smoke
+    python -m benchmarks.load_test --ingestion websocket --ws-drop-every 5
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeTelegram, FakePlane, FakeMattermost, FaultInjection
+
+WEBHOOK_SECRET = "load-test-secret"
+MATTERMOST_WEBHOOK_TOKEN = "load-test-mattermost-token"
+CHANNEL_ID = "load-test-channel"
+
+class Recorder:
+    """Собирает задержки по шагам сценария"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, step: str, latency: float) -> None:
+        self.latencies[step].append(latency)
+
+    def error(self, step: str) -> None:
+        self.errors[step] += 1
+
+    def report(self, elapsed: float) -> str:
+        lines = [f"{'step':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+        total = 0
+        for step in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(step, []))
+            total += len(values)
+            if len(values) >= 2:
+                q = statistics.quantiles(values, n=100, method="inclusive")
+                p50, p95, p99 = q[49], q[94], q[98]
+            elif values:
+                p50 = p95 = p99 = values[0]
+            else:
+                p50 = p95 = p99 = float("nan")
+            lines.append(
+                f"{step:<22}{len(values):>8}{self.errors.get(step, 0):>8}"
+                f"{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{p99 * 1000:>10.1f}"
+            )
+        lines.append(f"\n{total} сообщений за {elapsed:.1f} с: {total / elapsed:.1f} сообщений/с")
+        return "\n".join(lines)
+
+class Driver:
+    """Отправляет обновления Telegram и вебхуки Mattermost в приложение"""
+
+    def __init__(
+        self,
+        app_url: str,
+        telegram: FakeTelegram,
+        mattermost: FakeMattermost,
+        recorder: Recorder,
+        timeout: float,
+        websocket: bool = False
+    ):
+        self.app_url = app_url
+        self.websocket = websocket
+        self.telegram = telegram
+        self.mattermost = mattermost
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self.completed = 0
+
+    def _user(self, telegram_id: int) -> Dict[str, Any]:
+        return {"id": telegram_id, "is_bot": False, "first_name": "Load", "last_name": str(telegram_id)}
+
+    def _message(self, telegram_id: int, text: str) -> Dict[str, Any]:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self._user(telegram_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    async def _post_update(self, update: Dict[str, Any]) -> None:
+        async with self.session.post(
+            f"{self.app_url}/api/webhook/telegram",
+            json={"update_id": next(self._update_ids), **update},
+            headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+        ) as response:
+            response.raise_for_status()
+
+    async def step(self, step: str, telegram_id: int, update: Dict[str, Any]) -> Dict[str, Any]:
+        """Отправляет обновление и ждет ответа бота в этот чат"""
+        started = time.perf_counter()
+        try:
+            await self._post_update(update)
+            received_at, _, message = await self.telegram.next_message(telegram_id, self.timeout)
+        except Exception:
+            self.recorder.error(step)
+            raise
+        self.recorder.add(step, received_at - started)
+        return message
+
+    async def send_text(self, step: str, telegram_id: int, text: str) -> Dict[str, Any]:
+        return await self.step(step, telegram_id, {"message": self._message(telegram_id, text)})
+
+    async def press(self, step: str, telegram_id: int, data: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        callback = {
+            "id": str(next(self._update_ids)),
+            "from": self._user(telegram_id),
+            "chat_instance": str(telegram_id),
+            "data": data,
+            "message": message,
+        }
+        return await self.step(step, telegram_id, {"callback_query": callback})
+
+    async def support_reply(self, telegram_id: int, ticket_id: int, text: str) -> None:
+        """Ответ поддержки в треде тикета: от вебхука или события WebSocket до сообщения пользователю"""
+        step = "support_reply"
+        try:
+            thread_id = await self.mattermost.wait_thread(ticket_id, self.timeout)
+            # id треда сохраняется в тикете уже после ответа стенда
+            await asyncio.sleep(0.5)
+            started = time.perf_counter()
+            # Подключенному слушателю стенд сам рассылает событие posted
+            post = self.mattermost.add_post(CHANNEL_ID, text, FakeMattermost.SUPPORT_USER_ID, root_id=thread_id)
+            if not self.websocket:
+                async with self.session.post(
+                    f"{self.app_url}/api/webhook/mattermost",
+                    json={"token": MATTERMOST_WEBHOOK_TOKEN, "post_id": post["id"], "channel_id": CHANNEL_ID}
+                ) as response:
+                    response.raise_for_status()
+            received_at, _, _ = await self.telegram.next_message(telegram_id, self.timeout)
+        except Exception:
+            self.recorder.error(step)
+            raise
+        self.recorder.add(step, received_at - started)
+
+    async def run_user(self, telegram_id: int, messages: int, replies: int) -> int:
+        """Проходит сценарий и возвращает id созданной заявки"""
+        await self.send_text("start", telegram_id, "/start")
+        await self.send_text("register_name", telegram_id, f"Load User{telegram_id}")
+        await self.send_text("register_company", telegram_id, f"Company {telegram_id % 20}")
+        await self.send_text("register_shop", telegram_id, f"Shop {telegram_id % 200}")
+        await self.send_text("new_ticket", telegram_id, "Создать новую заявку")
+        await self.send_text("ticket_title", telegram_id, "Не работает касса")
+        confirmation = await self.send_text("ticket_description", telegram_id, "Касса не печатает чек")
+        created = await self.press("ticket_confirm", telegram_id, "confirm_ticket", confirmation)
+
+        match = re.search(r"#(\d+)", created.get("text", ""))
+        if not match:
+            self.recorder.error("ticket_confirm")
+            raise RuntimeError(f"Ticket number not found in reply: {created.get('text')!r}")
+        ticket_id = int(match.group(1))
+
+        for n in range(messages):
+            await self.send_text("user_message", telegram_id, f"Сообщение {n + 1}")
+        for n in range(replies):
+            await self.support_reply(telegram_id, ticket_id, f"Ответ поддержки {n + 1}")
+        self.completed += 1
+        return ticket_id
+
+def configure_environment(args: argparse.Namespace, telegram_url: str, plane_url: str, mattermost_url: str) -> None:
+    """Направляет бота на стенды; должно выполняться до импорта модулей бота"""
+    os.environ.update({
+        "BOT_TOKEN": "123456:LOAD-TEST",
+        "TELEGRAM_API_URL": telegram_url,
+        "TELEGRAM_MODE": "webhook",
+        "TELEGRAM_WEBHOOK_URL": f"http://{args.host}:{args.port}",
+        "TELEGRAM_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "PLANE_API_URL": plane_url,
+        "PLANE_API_TOKEN": "load-test",
+        "PLANE_WORKSPACE_ID": "workspace",
+        "PLANE_PROJECT_ID": "project",
+        "MATTERMOST_URL": mattermost_url,
+        "MATTERMOST_TOKEN": "load-test",
+        "MATTERMOST_WEBHOOK_TOKEN": MATTERMOST_WEBHOOK_TOKEN,
+        "MATTERMOST_TEAM": "team",
+        "MATTERMOST_CHANNEL": CHANNEL_ID,
+        "MATTERMOST_SUPPORT_USER_ID": "bot-user",
+        "MATTERMOST_SUPPORT_USERNAME": "support_bot",
+        "MATTERMOST_INGESTION_MODE": args.ingestion,
+        "MATTERMOST_WS_URL": mattermost_url.replace("http://", "ws://", 1) + "/api/v4/websocket",
+        "MATTERMOST_WS_RECONNECT_MAX_DELAY": "1",
+    })
+    if not args.telegram_limits:
+        # Измеряем сам бот, а не лимиты Telegram
+        os.environ.update({
+            "TELEGRAM_GLOBAL_RATE": "100000",
+            "TELEGRAM_CHAT_RATE": "100000",
+            "TELEGRAM_CHAT_BURST": "100000",
+        })
+
+async def smoke(args: argparse.Namespace, telegram: FakeTelegram, mattermost: FakeMattermost, telegram_id: int) -> None:
+    """Один пользователь проходит весь сценарий; любая ошибка прерывает тест"""
+    websocket = args.ingestion == "websocket"
+    driver = Driver(f"http://{args.host}:{args.port}", telegram, mattermost, Recorder(), args.timeout, websocket)
+    async with aiohttp.ClientSession() as session:
+        driver.session = session
+        ticket_id = await driver.run_user(telegram_id, args.messages, args.replies)
+        if websocket:
+            # Ответ, отправленный во время обрыва, сервер дошлет после возобновления сессии
+            if not mattermost.drop_websockets():
+                raise RuntimeError("Mattermost WebSocket listener is not connected")
+            await driver.support_reply(telegram_id, ticket_id, "Ответ во время обрыва соединения")
+            if not mattermost.ws_resumes:
+                raise RuntimeError("Mattermost WebSocket session was not resumed")
+
+async def load(args: argparse.Namespace, telegram: FakeTelegram, plane: FakePlane, mattermost: FakeMattermost, base_id: int) -> None:
+    """Нагрузочный прогон: args.users пользователей, не больше args.concurrency одновременно"""
+    recorder = Recorder()
+    websocket = args.ingestion == "websocket"
+    driver = Driver(f"http://{args.host}:{args.port}", telegram, mattermost, recorder, args.timeout, websocket)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def drop_websockets() -> None:
+        while True:
+            await asyncio.sleep(args.ws_drop_every)
+            mattermost.drop_websockets()
+
+    async def run(n: int) -> None:
+        async with semaphore:
+            try:
+                await driver.run_user(base_id + n, args.messages, args.replies)
+            except Exception:
+                pass
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        driver.session = session
+        dropper = asyncio.create_task(drop_websockets()) if websocket and args.ws_drop_every else None
+        started = time.perf_counter()
+        await asyncio.gather(*(run(n) for n in range(args.users)))
+        elapsed = time.perf_counter() - started
+        if dropper:
+            dropper.cancel()
+
+    print(recorder.report(elapsed))
+    print(f"\nПрошли сценарий целиком: {driver.completed} из {args.users}")
+    print(f"Запросов к стендам: Telegram {telegram.requests}, Plane {plane.requests}, Mattermost {mattermost.requests}")
+    if websocket:
+        print(f"WebSocket Mattermost: подключений {mattermost.ws_connects}, возобновлений сессии {mattermost.ws_resumes}")
+
+async def main(args: argparse.Namespace) -> None:
+    faults = FaultInjection(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    telegram = FakeTelegram(FaultInjection(latency=args.latency, jitter=args.jitter))
+    plane = FakePlane(faults)
+    mattermost = FakeMattermost(faults)
+    telegram_url = await telegram.start()
+    plane_url = await plane.start()
+    mattermost_url = await mattermost.start()
+
+    configure_environment(args, telegram_url, plane_url, mattermost_url)
+
+    import uvicorn
+    from bot.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # Диапазон id, не пересекающийся с предыдущими запусками
+    base_id = random.randint(1_000_000_000, 2_000_000_000 - args.users - 1)
+    try:
+        await smoke(args, telegram, mattermost, base_id + args.users)
+        if args.smoke:
+            print("Smoke-прогон пройден")
+        else:
+            await load(args, telegram, plane, mattermost, base_id)
+    finally:
+        server.should_exit = True
+        await server_task
+        for fake in (telegram, plane, mattermost):
+            await fake.stop()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота со стендами внешних API")
+    parser.add_argument("--users", type=int, default=100, help="Количество симулированных пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременно активных пользователей")
+    parser.add_argument("--messages", type=int, default=3, help="Сообщений пользователя в заявку")
+    parser.add_argument("--replies", type=int, default=1, help="Ответов поддержки на заявку")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа стендов, секунды")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Разброс задержки, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500 от Plane и Mattermost")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Ожидание ответа бота, секунды")
+    parser.add_argument("--telegram-limits", action="store_true", help="Соблюдать лимиты скорости Telegram")
+    parser.add_argument("--ingestion", choices=("webhook", "websocket"), default="webhook", help="Как бот получает посты Mattermost")
+    parser.add_argument("--ws-drop-every", type=float, default=0.0, help="Обрывать WebSocket раз в N секунд (0 - не обрывать)")
+    parser.add_argument("--smoke", action="store_true", help="Только smoke-прогон одного пользователя")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
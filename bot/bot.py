@@ -1,4 +1,12 @@
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from bot.config import settings
+from bot.middlewares.rate_limit import rate_limiter
 
-bot = Bot(token=settings.BOT_TOKEN) 
\ No newline at end of file
+# Собственный сервер Bot API (локальный telegram-bot-api или стенд для нагрузочных тестов)
+session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL)) if settings.TELEGRAM_API_URL else None
+
+bot = Bot(token=settings.BOT_TOKEN, session=session)
+# Все исходящие запросы проходят через общий ограничитель скорости
+bot.session.middleware(rate_limiter)
@@ -1,9 +1,18 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # Telegram
     BOT_TOKEN: str
+    TELEGRAM_API_URL: Optional[str] = None  # Адрес собственного сервера Bot API
+    TELEGRAM_MODE: str = "polling"  # "polling" (для разработки) или "webhook"
+    TELEGRAM_WEBHOOK_URL: Optional[str] = None  # Публичный адрес приложения, например https://bot.example.com
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None
+    WEB_WORKERS: int = 1  # Количество процессов uvicorn (больше одного только в режиме webhook)
+    TELEGRAM_GLOBAL_RATE: float = 30.0  # Сообщений в секунду на весь бот
+    TELEGRAM_CHAT_RATE: float = 1.0  # Сообщений в секунду в один чат
+    TELEGRAM_CHAT_BURST: int = 3  # Допустимая пачка сообщений в один чат
+    TELEGRAM_MAX_RETRIES: int = 5  # Повторы после ответа 429
     
     # PostgreSQL
     POSTGRES_USER: str
@@ -11,6 +20,20 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
     POSTGRES_DB: str
+    DB_ECHO: bool = False  # Логирование всех SQL-запросов (только для отладки)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # Ожидание свободного соединения, секунды
+    DB_POOL_RECYCLE: int = 1800  # Пересоздание соединений старше N секунд
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Кэш подготовленных выражений asyncpg
+    DB_PGBOUNCER: bool = False  # Совместимость с PgBouncer в режиме transaction pooling
+    DB_READONLY_POOL_SIZE: int = 5  # Пул соединений только для чтения (обработчики с flags={"db": "readonly"})
+    DB_REPLICA_HOST: Optional[str] = None  # Реплика для чтения; без нее все запросы идут в основную БД
+    DB_REPLICA_PORT: int = 5432
+    DB_REPLICA_MAX_LAG: float = 5.0  # При большем отставании реплики чтения идут в основную БД, секунды
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 2.0  # Период проверки отставания реплики, секунды
+    DB_READ_YOUR_WRITES_TTL: int = 10  # Сколько секунд после записи чтения пользователя идут в основную БД
     
     # Redis
     REDIS_HOST: str = "localhost"
@@ -26,6 +49,9 @@ class Settings(BaseSettings):
     MATTERMOST_CHANNEL: str
     MATTERMOST_SUPPORT_USER_ID: str
     MATTERMOST_SUPPORT_USERNAME: str
+    MATTERMOST_INGESTION_MODE: str = "webhook"  # "webhook" или "websocket" (вебхук остается резервным)
+    MATTERMOST_WS_URL: Optional[str] = None  # По умолчанию wss://MATTERMOST_URL/api/v4/websocket
+    MATTERMOST_WS_RECONNECT_MAX_DELAY: float = 60.0
     
     # Plane.so
     PLANE_API_URL: str
@@ -33,8 +59,78 @@ class Settings(BaseSettings):
     PLANE_WORKSPACE_ID: str
     PLANE_PROJECT_ID: str
     
+    # HTTP-клиент для внешних API
+    HTTP_LIMIT_PER_HOST: int = 100  # Размер пула соединений на хост
+    HTTP_HOST_LIMITS: Dict[str, int] = {}  # Переопределения лимита по имени хоста
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_TOTAL_TIMEOUT: float = 30.0
+    
+    # Outbox: фоновая доставка в Plane и Mattermost
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_POLL_INTERVAL: float = 1.0  # Интервал опроса при пустой очереди, секунды
+    OUTBOX_LEASE_TIME: int = 60  # Время аренды задания воркером, секунды
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETRY_BASE_DELAY: float = 2.0  # Базовая задержка, удваивается с каждой попыткой
+    OUTBOX_RETRY_MAX_DELAY: float = 300.0
+    OUTBOX_COALESCE_WINDOW: float = 2.0  # Пауза, в течение которой сообщения пользователя склеиваются; 0 - отключено
+    OUTBOX_COALESCE_MAX_DELAY: float = 10.0  # Максимальная задержка первого сообщения пачки, секунды
+    OUTBOX_COALESCE_MAX_MESSAGES: int = 20
+    OUTBOX_COALESCE_MAX_CHARS: int = 4000
+    
+    # Очередь вебхуков Mattermost
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_RETRIES: int = 5  # Повторы обработки поста после ошибки (Telegram недоступен и т.п.)
+    WEBHOOK_RETRY_BASE_DELAY: float = 2.0  # Задержка первого повтора, удваивается с каждой попыткой
+    WEBHOOK_RETRY_MAX_DELAY: float = 60.0
+    
+    # Кэш пользователей
+    USER_CACHE_TTL: int = 3600  # Время жизни профиля в Redis, секунды
+    USER_CACHE_NEGATIVE_TTL: int = 300  # Время жизни записи о незарегистрированном пользователе
+    USER_CACHE_LOCAL_TTL: int = 30  # Время жизни профиля в памяти процесса
+    USER_CACHE_LOCAL_SIZE: int = 10000
+    
+    # Список заявок пользователя
+    TICKET_PAGE_SIZE: int = 10
+    TICKET_PAGE_CACHE_TTL: int = 30  # Время жизни страницы в кэше, секунды
+    
+    # История переписки по заявке
+    HISTORY_PAGE_SIZE: int = 30  # Сообщений, читаемых из БД за раз
+    
+    # Маршруты ответов поддержки (root_id поста Mattermost -> тикет)
+    TICKET_ROUTE_TTL: int = 86400  # Время жизни маршрута в Redis, секунды
+    TICKET_ROUTE_NEGATIVE_TTL: int = 300  # Для постов, не являющихся тредами тикетов
+    TICKET_ROUTE_LOCAL_TTL: int = 30  # Время жизни маршрута в памяти процесса
+    TICKET_ROUTE_LOCAL_SIZE: int = 10000
+    
+    # Административный API (отключен, если токен не задан)
+    ADMIN_API_TOKEN: Optional[str] = None
+    
+    # Рассылки
+    BROADCAST_BATCH_SIZE: int = 100  # Размер пачки получателей между сохранениями прогресса
+    BROADCAST_LEASE_TIME: int = 120  # Время аренды рассылки репликой, секунды
+    
+    # Ключи идемпотентности (повторные callback, сообщения и посты)
+    IDEMPOTENCY_TTL: int = 86400  # секунды
+    
+    # Вложения
+    ATTACHMENT_CHUNK_SIZE: int = 64 * 1024  # Размер чанка при потоковой пересылке файлов, байты
+    
+    # Логирование
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" или "text"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # Доля DEBUG-записей, попадающих в вывод
+    
     # Дополнительные настройки
-    TICKET_ACTIVE_TIME: int = 3600  # Время активности тикета в секундах (1 час)
+    TICKET_ACTIVE_TIME: int = 3600  # Время без активности до автозакрытия тикета, секунды (1 час); 0 - не закрывать
+    SLA_FIRST_RESPONSE_TIME: int = 900  # Эскалация, если поддержка не ответила за это время, секунды; 0 - отключено
+    SLA_ESCALATION_MENTION: str = "@channel"
+    TIMER_POLL_INTERVAL: float = 1.0  # Интервал проверки таймеров, секунды
+    TIMER_BATCH_SIZE: int = 100
+    TIMER_LEASE_TIME: int = 60  # Через сколько секунд необработанный таймер сработает повторно
+    TIMER_BACKFILL_SPREAD: int = 3600  # На сколько секунд растянуть закрытие давно неактивных тикетов при первом запуске
     
     class Config:
         env_file = ".env"
@@ -1,12 +1,150 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from redis.asyncio import Redis
 from bot.config import settings
+from bot.utils.metrics import DB_QUERY_LATENCY
+from typing import Any, Dict, Optional
+from uuid import uuid4
+import time
 
 # PostgreSQL
 DATABASE_URL = f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+REPLICA_URL = f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.DB_REPLICA_HOST}:{settings.DB_REPLICA_PORT}/{settings.POSTGRES_DB}"
+
+class PoolMetrics:
+    """Метрики пула соединений: занятость, ожидание соединения и переполнение"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.overflow_events = 0
+        self.pool = None
+
+    def record_wait(self, wait: float) -> None:
+        self.checkouts += 1
+        self.wait_time_total += wait
+        self.wait_time_max = max(self.wait_time_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        result = {
+            "checkouts": self.checkouts,
+            "wait_time_avg_seconds": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_time_max_seconds": round(self.wait_time_max, 6),
+            "overflow_events": self.overflow_events,
+        }
+        if isinstance(self.pool, AsyncAdaptedQueuePool):
+            result.update({
+                "size": self.pool.size(),
+                "checked_out": self.pool.checkedout(),
+                "checked_in": self.pool.checkedin(),
+                "overflow": self.pool.overflow(),
+            })
+        return result
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, измеряющий время ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+def create_engine_from_settings(
+    url: str = DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    read_only: bool = False,
+    pool_size: Optional[int] = None
+):
+    """
+    Создает движок по профилю из настроек.
+
+    В режиме DB_PGBOUNCER пул держит PgBouncer (transaction pooling), поэтому
+    локальный пул отключается, а кэши подготовленных выражений asyncpg
+    выключаются и выражениям даются уникальные имена.
+
+    Движок read_only работает в autocommit, а запись запрещает сам сервер:
+    default_transaction_read_only задается при подключении. PgBouncer не
+    пропускает такие параметры подключения, поэтому в режиме DB_PGBOUNCER
+    каждое чтение выполняется в транзакции READ ONLY.
+    """
+    if settings.DB_PGBOUNCER:
+        engine = create_async_engine(
+            f"{url}?prepared_statement_cache_size=0",
+            echo=settings.DB_ECHO,
+            poolclass=NullPool,
+            connect_args={
+                "statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        )
+        return engine.execution_options(postgresql_readonly=True) if read_only else engine
+
+    connect_args: Dict[str, Any] = {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if read_only:
+        connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+    engine = create_async_engine(
+        f"{url}?prepared_statement_cache_size={settings.DB_STATEMENT_CACHE_SIZE}",
+        echo=settings.DB_ECHO,
+        poolclass=poolclass,
+        pool_size=pool_size or settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+    return engine.execution_options(isolation_level="AUTOCOMMIT") if read_only else engine
+
+engine = create_engine_from_settings()
+pool_metrics.pool = engine.sync_engine.pool
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    # Новое соединение сверх pool_size - событие переполнения
+    pool = engine.sync_engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool) and pool.overflow() > 0:
+        pool_metrics.overflow_events += 1
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    # Метка - тип выражения (SELECT, INSERT, ...), чтобы не плодить ряды по тексту запроса
+    DB_QUERY_LATENCY.labels(statement.lstrip().split(" ", 1)[0].upper()).observe(time.perf_counter() - started)
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _on_query_error(exception_context):
+    # Выражение упало в драйвере, after_cursor_execute не будет вызван:
+    # снимаем его время начала, иначе следующие замеры сдвинутся
+    conn = exception_context.connection
+    if conn is not None and exception_context.cursor is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+# Движок для обработчиков, которые только читают: отдельный пул, соединения
+# которого сервер открывает в режиме только для чтения
+readonly_engine = create_engine_from_settings(
+    poolclass=AsyncAdaptedQueuePool,
+    read_only=True,
+    pool_size=settings.DB_READONLY_POOL_SIZE
+)
+
+# Реплика для чтения (необязательна). Пулы readonly_engine и реплики
+# не входят в pool_metrics, которые описывают пул основной БД
+replica_engine = (
+    create_engine_from_settings(REPLICA_URL, AsyncAdaptedQueuePool, read_only=True)
+    if settings.DB_REPLICA_HOST else None
+)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -31,4 +169,7 @@ async def init_db():
 async def close_db():
     """Close database connections"""
     await engine.dispose()
+    await readonly_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
     await redis.close()
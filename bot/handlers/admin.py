@@ -0,0 +1,192 @@
+from fastapi import APIRouter, HTTPException, Header, Depends
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, Optional
+import logging
+from bot.config import settings
+from bot.database import get_session
+from bot.models.models import Broadcast, BroadcastFailure, Ticket
+from bot.services.broadcast import broadcast_service
+from bot.services.ticket_service import TicketService
+from bot.services.user_cache import user_cache
+from bot.services.ticket_routes import ticket_routes
+from bot.services.replica import replica_router, get_readonly_session
+from bot.database import pool_metrics
+from bot.middlewares.database import DatabaseMiddleware
+from bot.middlewares.rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+ticket_service = TicketService()
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Проверяет токен администратора (если ADMIN_API_TOKEN не задан, API отключен)"""
+    if not settings.ADMIN_API_TOKEN or x_admin_token != settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+@router.get("/stats/user-cache")
+async def user_cache_stats() -> Dict[str, Any]:
+    """Попадания и промахи кэша пользователей"""
+    return user_cache.stats()
+
+@router.get("/stats/ticket-routes")
+async def ticket_routes_stats() -> Dict[str, Any]:
+    """Попадания и промахи кэша маршрутов ответов поддержки"""
+    return ticket_routes.stats()
+
+@router.get("/stats/db-pool")
+async def db_pool_stats() -> Dict[str, Any]:
+    """Состояние пула соединений с базой данных"""
+    return pool_metrics.stats()
+
+@router.get("/stats/replica")
+async def replica_stats() -> Dict[str, Any]:
+    """Отставание реплики и распределение чтений между репликой и основной БД"""
+    return replica_router.stats()
+
+@router.get("/stats/updates")
+async def updates_stats() -> Dict[str, Any]:
+    """Сколько обновлений Telegram обращались к базе данных"""
+    return DatabaseMiddleware.stats()
+
+@router.get("/stats/telegram-sender")
+async def telegram_sender_stats() -> Dict[str, Any]:
+    """Очередь и задержка исходящих сообщений Telegram"""
+    return rate_limiter.stats()
+
+class BroadcastRequest(BaseModel):
+    text: str
+    company: Optional[str] = None
+    shop: Optional[str] = None
+
+def _broadcast_to_dict(broadcast: Broadcast) -> Dict[str, Any]:
+    return {
+        "id": broadcast.id,
+        "status": broadcast.status,
+        "company": broadcast.company,
+        "shop": broadcast.shop,
+        "sent": broadcast.sent,
+        "blocked": broadcast.blocked,
+        "failed": broadcast.failed,
+        "last_user_id": broadcast.last_user_id,
+        "created_at": broadcast.created_at,
+        "finished_at": broadcast.finished_at,
+    }
+
+async def _get_broadcast(session: AsyncSession, broadcast_id: int) -> Broadcast:
+    broadcast = await session.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return broadcast
+
+@router.post("/broadcasts")
+async def create_broadcast(data: BroadcastRequest, session: AsyncSession = Depends(get_session)) -> Dict[str, Any]:
+    """Запускает рассылку пользователям компании и/или магазина"""
+    if not data.company and not data.shop:
+        raise HTTPException(status_code=400, detail="company or shop is required")
+    broadcast = await broadcast_service.create(session, data.text, company=data.company, shop=data.shop)
+    return _broadcast_to_dict(broadcast)
+
+@router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: int, session: AsyncSession = Depends(get_session)) -> Dict[str, Any]:
+    """Прогресс рассылки"""
+    return _broadcast_to_dict(await _get_broadcast(session, broadcast_id))
+
+@router.get("/broadcasts/{broadcast_id}/failures")
+async def get_broadcast_failures(
+    broadcast_id: int,
+    after_id: int = 0,
+    limit: int = 100,
+    session: AsyncSession = Depends(get_readonly_session)
+) -> Dict[str, Any]:
+    """Получатели, которым не удалось доставить рассылку (постранично по after_id)"""
+    failures = list(await session.scalars(
+        select(BroadcastFailure)
+        .where(BroadcastFailure.broadcast_id == broadcast_id, BroadcastFailure.id > after_id)
+        .order_by(BroadcastFailure.id)
+        .limit(min(limit, 1000))
+    ))
+    return {
+        "items": [
+            {
+                "id": failure.id,
+                "user_id": failure.user_id,
+                "telegram_id": failure.telegram_id,
+                "reason": failure.reason,
+                "error": failure.error,
+            }
+            for failure in failures
+        ],
+        "next_after_id": failures[-1].id if failures else None,
+    }
+
+@router.get("/tickets/search")
+async def search_tickets(
+    q: str,
+    company: Optional[str] = None,
+    shop: Optional[str] = None,
+    limit: int = 20,
+    session: AsyncSession = Depends(get_readonly_session)
+) -> Dict[str, Any]:
+    """Полнотекстовый поиск по тикетам и сообщениям, с фильтром по компании и магазину"""
+    rows = await ticket_service.search_tickets(session, q, company, shop, limit=min(limit, 100))
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "title": row.title,
+                "status": row.status,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "full_name": row.full_name,
+                "company": row.company,
+                "shop": row.shop,
+                "rank": row.rank,
+            }
+            for row in rows
+        ],
+    }
+
+@router.get("/tickets/{ticket_id}/messages")
+async def get_ticket_messages(
+    ticket_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    session: AsyncSession = Depends(get_readonly_session)
+) -> Dict[str, Any]:
+    """История переписки по тикету (постранично по курсору next)"""
+    if not await session.scalar(select(Ticket.id).where(Ticket.id == ticket_id)):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    try:
+        rows, next_cursor = await ticket_service.get_messages_page(session, ticket_id, cursor, min(limit, 1000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "sender_type": row.sender_type,
+                "content": row.content,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ],
+        "next": next_cursor,
+    }
+
+@router.post("/broadcasts/{broadcast_id}/resume")
+async def resume_broadcast(broadcast_id: int, session: AsyncSession = Depends(get_session)) -> Dict[str, Any]:
+    """Продолжает прерванную рассылку"""
+    broadcast = await _get_broadcast(session, broadcast_id)
+    if broadcast.status != "running":
+        raise HTTPException(status_code=409, detail=f"Broadcast is {broadcast.status}")
+    resumed = await broadcast_service.resume(broadcast_id)
+    return {"id": broadcast_id, "resumed": resumed}
+
+@router.post("/broadcasts/{broadcast_id}/cancel")
+async def cancel_broadcast(broadcast_id: int, session: AsyncSession = Depends(get_session)) -> Dict[str, Any]:
+    """Отменяет рассылку"""
+    broadcast = await _get_broadcast(session, broadcast_id)
+    await broadcast_service.cancel(session, broadcast)
+    return _broadcast_to_dict(broadcast)
@@ -0,0 +1,140 @@
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.services.ticket_service import TicketService
+from bot.services.user_cache import UserProfile
+from typing import Any, List, Optional, Tuple
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+ticket_service = TicketService()
+
+# Максимальная длина сообщения Telegram в кодовых единицах UTF-16
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def utf16_len(text: str) -> int:
+    """Длина текста так, как ее считает Telegram (эмодзи - две единицы)"""
+    return len(text.encode("utf-16-le")) // 2
+
+def utf16_truncate(text: str, limit: int) -> str:
+    """Обрезает текст до limit единиц UTF-16, не разрывая суррогатную пару"""
+    return text.encode("utf-16-le")[:limit * 2].decode("utf-16-le", errors="ignore")
+
+def render_history(title: str, rows: List[Any]) -> Tuple[str, int]:
+    """
+    Собирает страницу истории, не превышающую лимит сообщения Telegram.
+
+    Returns:
+        текст и количество вошедших в него сообщений
+    """
+    text = f"История заявки {title}\n"
+    used = utf16_len(text)
+    count = 0
+    for row in rows:
+        author = "👔 Поддержка" if row.sender_type == "support" else "👤 Вы"
+        line = f"\n{row.created_at:%d.%m %H:%M} {author}:\n{row.content}\n"
+        budget = TELEGRAM_MESSAGE_LIMIT - used
+        if utf16_len(line) > budget:
+            if count:
+                break
+            # Одно сообщение длиннее лимита показываем обрезанным
+            line = utf16_truncate(line, budget - 1) + "…"
+        text += line
+        used += utf16_len(line)
+        count += 1
+    return text, count
+
+def get_history_keyboard(ticket_id: int, cursor: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Кнопка перехода к следующей странице истории"""
+    if not cursor:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Далее ➡️", callback_data=f"history:{ticket_id}:{cursor}")
+    ]])
+
+async def _history_page(session: AsyncSession, ticket_id: int, title: str, cursor: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Текст страницы истории и курсор следующей"""
+    rows, next_cursor = await ticket_service.get_messages_page(session, ticket_id, cursor)
+    if not rows:
+        return f"История заявки {title} пуста.", None
+    text, count = render_history(title, rows)
+    if count < len(rows):
+        # Не вошедшие в лимит сообщения будут первыми на следующей странице
+        last = rows[count - 1]
+        next_cursor = ticket_service.encode_cursor("n", last.created_at, last.id)
+    return text, next_cursor
+
+async def _find_ticket(session: AsyncSession, state: FSMContext, user: UserProfile, args: Optional[str]):
+    """Тикет из аргумента команды, выбранный тикет или последний тикет пользователя"""
+    if args and args.strip().lstrip("#").isdigit():
+        ticket = await ticket_service.get_ticket_by_id(session, int(args.strip().lstrip("#")))
+    else:
+        selected_ticket_id = (await state.get_data()).get('selected_ticket_id')
+        if selected_ticket_id:
+            ticket = await ticket_service.get_ticket_by_id(session, selected_ticket_id)
+        else:
+            ticket = await ticket_service.get_last_ticket(session, user.id)
+    # Чужие тикеты не показываем
+    return ticket if ticket and ticket.user_id == user.id else None
+
+@router.message(Command("history"), flags={"db": "readonly"})
+async def cmd_history(message: Message, command: CommandObject, state: FSMContext, session: AsyncSession):
+    """История переписки по заявке: /history или /history <номер заявки>"""
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
+    if not user:
+        await message.answer("Пожалуйста, начните с команды /start для регистрации.")
+        return
+
+    ticket = await _find_ticket(session, state, user, command.args)
+    if not ticket:
+        await message.answer("Заявка не найдена.")
+        return
+
+    text, cursor = await _history_page(session, ticket.id, f"#{ticket.id} {ticket.title}", None)
+    await message.answer(text, reply_markup=get_history_keyboard(ticket.id, cursor))
+
+@router.message(Command("search"), flags={"db": "readonly"})
+async def cmd_search(message: Message, command: CommandObject, session: AsyncSession):
+    """Поиск по своим заявкам и переписке: /search <текст>"""
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
+    if not user:
+        await message.answer("Пожалуйста, начните с команды /start для регистрации.")
+        return
+
+    if not command.args or not command.args.strip():
+        await message.answer("Укажите, что искать: /search <текст>")
+        return
+
+    rows = await ticket_service.search_tickets(session, command.args.strip(), user_id=user.id, limit=10)
+    if not rows:
+        await message.answer("Ничего не найдено.")
+        return
+
+    lines = [f"#{row.id} {row.title} ({row.status}, {row.created_at:%d.%m.%Y})" for row in rows]
+    await message.answer("Найденные заявки:\n" + "\n".join(lines) + "\n\nИстория заявки: /history <номер>")
+
+@router.callback_query(F.data.startswith("history:"), flags={"db": "readonly"})
+async def process_history_page(callback: CallbackQuery, session: AsyncSession):
+    """Следующая страница истории"""
+    try:
+        _, ticket_id, cursor = callback.data.split(":", 2)
+        ticket_id = int(ticket_id)
+        ticket_service.decode_cursor(cursor)
+    except ValueError:
+        await callback.answer("Страница недоступна, откройте историю заново: /history")
+        return
+
+    user = await ticket_service.get_user_profile(session, callback.from_user.id)
+    ticket = await ticket_service.get_ticket_by_id(session, ticket_id)
+    if not user or not ticket or ticket.user_id != user.id:
+        await callback.answer("Заявка не найдена")
+        return
+
+    text, next_cursor = await _history_page(session, ticket.id, f"#{ticket.id} {ticket.title}", cursor)
+    # Новая страница отправляется отдельным сообщением, предыдущие остаются в чате
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.message.answer(text, reply_markup=get_history_keyboard(ticket.id, next_cursor))
+    await callback.answer()
@@ -1,118 +1,218 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, Request, HTTPException
 from bot.services.ticket_service import TicketService
 from bot.services.mattermost import MattermostService
-from bot.services.plane import PlaneService
-from bot.database import get_session
-from sqlalchemy.ext.asyncio import AsyncSession
+from bot.services.attachments import attachment_service
+from bot.services import idempotency
+from bot.services.replica import replica_router
+from bot.services.event_queue import EventQueue, QueueFullError
+from bot.database import async_session
+from bot.utils.metrics import WEBHOOK_LATENCY, MESSAGES_RELAYED, ERRORS
+from collections import OrderedDict
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Union
 from bot.config import settings
 from bot.bot import bot
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/webhook/mattermost")
-async def mattermost_webhook(
-    request: Request,
-    session: AsyncSession = Depends(get_session)
-) -> Dict[str, str]:
+mattermost_service = MattermostService()
+ticket_service = TicketService()
+
+# Недавно обработанные посты: при работе через WebSocket тот же пост
+# может прийти и через вебхук
+_seen_posts: "OrderedDict[str, None]" = OrderedDict()
+_SEEN_POSTS_LIMIT = 10000
+
+def _mark_seen(post_id: str) -> bool:
+    """Запоминает пост, возвращает False если он уже обрабатывался"""
+    if post_id in _seen_posts:
+        return False
+    _seen_posts[post_id] = None
+    if len(_seen_posts) > _SEEN_POSTS_LIMIT:
+        _seen_posts.popitem(last=False)
+    return True
+
+async def process_mattermost_post(post: Union[str, Dict[str, Any]]) -> None:
     """
-    Обработчик вебхуков от Mattermost.
+    Обрабатывает пост из Mattermost в фоне.
     Получает сообщения из тредов и отправляет их пользователям в Telegram.
+
+    Args:
+        post: id поста (из вебхука) или полный пост (из WebSocket)
     """
+    started = time.perf_counter()
+    try:
+        await _process_mattermost_post(post)
+    except Exception:
+        ERRORS.labels("mattermost_webhook").inc()
+        raise
+    finally:
+        WEBHOOK_LATENCY.labels("process").observe(time.perf_counter() - started)
+
+async def _process_mattermost_post(post: Union[str, Dict[str, Any]]) -> None:
+    post_id = post['id'] if isinstance(post, dict) else post
+    if not _mark_seen(post_id):
+        logger.debug("Пост %s уже обработан", post_id)
+        return
+    # Тот же пост может прийти на другую реплику (повтор вебхука, WebSocket)
+    idempotency_key = f"mattermost_post:{post_id}"
+    if not await idempotency.claim(idempotency_key):
+        logger.debug("Пост %s уже обработан другой репликой", post_id)
+        return
     try:
-        # Пробуем получить данные как JSON
-        try:
-            data_dict = await request.json()
-        except:
-            # Если не получилось, пробуем как form-data
-            form_data = await request.form()
-            data_dict = dict(form_data)
-            
-        logger.info(f"Получен вебхук от Mattermost: {data_dict}")
-
-        # Проверяем токен
-        if data_dict.get('token') != settings.MATTERMOST_WEBHOOK_TOKEN:
-            logger.error(f"Неверный токен. Получен: {data_dict.get('token')}, Ожидался: {settings.MATTERMOST_WEBHOOK_TOKEN}")
-            raise HTTPException(status_code=403, detail="Invalid token")
-
-        # Получаем информацию о посте
-        post_id = data_dict.get('post_id')
-        if not post_id:
-            raise HTTPException(status_code=400, detail="No post_id provided")
-
-        # Получаем полную информацию о посте через API Mattermost
-        mattermost_service = MattermostService()
-        post_info = await mattermost_service.get_post(post_id)
-        
-        # Проверяем, что это ответ в треде
-        root_id = post_info.get('root_id')
-        if not root_id:
-            logger.warning(f"Тикет не найден для root_id: {root_id}")
-            return {"status": "ok", "message": "Not a thread reply"}
-
-        # Получаем тикет по root_id
-        ticket_service = TicketService()
-        ticket = await ticket_service.get_ticket_by_mattermost_post_id(session, root_id)
+        await _relay_post(post_id, post)
+    except Exception:
+        # Пост еще может прийти через WebSocket или повторный вебхук
+        _seen_posts.pop(post_id, None)
+        await idempotency.release(idempotency_key)
+        raise
+
+async def _relay_post(post_id: str, post: Union[str, Dict[str, Any]]) -> None:
+    """Пересылает ответ поддержки пользователю и добавляет его в тикет"""
+    # Из вебхука приходит только id, полную информацию о посте получаем через API Mattermost
+    post_info = post if isinstance(post, dict) else await mattermost_service.get_post(post_id)
+    if not post_info:
+        raise RuntimeError(f"Mattermost post {post_id} is not available")
+
+    # Проверяем, что это ответ в треде
+    root_id = post_info.get('root_id')
+    if not root_id:
+        logger.debug("Пост %s не является ответом в треде", post_id)
+        return
+
+    # Проверяем, является ли сообщение от бота
+    user_id = post_info.get('user_id')
+    if user_id == settings.MATTERMOST_SUPPORT_USER_ID:
+        logger.debug("Сообщение от бота, игнорируем")
+        return
+
+    # Получаем текст сообщения и вложения
+    message_text = post_info.get('message', '')
+    file_ids = post_info.get('file_ids') or []
+    if not message_text and not file_ids:
+        return
+
+    # Сессия подключается к БД только при первом запросе: при попадании
+    # в кэш маршрутов чтений из БД нет
+    async with async_session() as session:
+        # Тикет и чат пользователя по root_id
+        ticket = await ticket_service.get_ticket_route(session, root_id)
         if not ticket:
-            logger.warning(f"Тикет не найден для root_id: {root_id}")
-            return {"status": "ok", "message": "Ticket not found"}
-
-        # Получаем информацию о пользователе
-        user = await ticket_service.get_user_by_id(session, ticket.user_id)
-        if not user:
-            logger.warning(f"Пользователь не найден для тикета {ticket.id}")
-            return {"status": "ok", "message": "User not found"}
-
-        # Получаем текст сообщения
-        message_text = post_info.get('message', '')
-        if not message_text:
-            return {"status": "ok", "message": "Empty message"}
-
-        # Проверяем, является ли сообщение от бота
-        user_id = post_info.get('user_id')
-        if user_id == settings.MATTERMOST_SUPPORT_USER_ID:
-            logger.info("Сообщение от бота, игнорируем")
-            return {"status": "ok", "message": "Message from bot"}
-
-        # Получаем информацию о пользователе Mattermost
+            logger.warning("Тикет не найден для root_id: %s", root_id)
+            return
+        if ticket.status == "canceled":
+            logger.debug("Тикет %s отменен, ответ не пересылается", ticket.id)
+            return
+
+        # Получаем информацию о пользователе Mattermost; без нее ответ
+        # все равно доставляется, но без имени сотрудника
         mattermost_user = await mattermost_service.get_user(user_id)
         if not mattermost_user:
-            logger.error(f"Не удалось получить информацию о пользователе Mattermost {user_id}")
-            return {"status": "error", "message": "Failed to get Mattermost user info"}
+            logger.warning("Не удалось получить информацию о пользователе Mattermost %s", user_id)
+            mattermost_user = {}
 
         # Получаем полное имя пользователя
         first_name = mattermost_user.get('first_name', '')
         last_name = mattermost_user.get('last_name', '')
         full_name = f"{first_name} {last_name}".strip() or mattermost_user.get('username', 'Сотрудник поддержки')
 
-        # Отправляем сообщение в Telegram
-        try:
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text=f"Ответ по заявке *{ticket.title}*\n\n_👔 {full_name}_:\n\n{message_text}",
-                parse_mode="Markdown"
-            )
-            logger.info(f"Сообщение отправлено пользователю {user.telegram_id}")
-        except Exception as e:
-            logger.error(f"Ошибка при отправке сообщения в Telegram: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to send message to Telegram: {str(e)}")
-
-        # Добавляем сообщение в тикет
+        # Отправляем сообщение в Telegram. Если дальше что-то упадет, при
+        # повторе обработки поста текст пользователю второй раз не уйдет
+        sent_key = f"mattermost_post:{post_id}:sent"
+        if await idempotency.claim(sent_key):
+            try:
+                await bot.send_message(
+                    chat_id=ticket.telegram_id,
+                    text=f"Ответ по заявке *{ticket.title}*\n\n_👔 {full_name}_:\n\n{message_text}",
+                    parse_mode="Markdown"
+                )
+            except Exception:
+                await idempotency.release(sent_key)
+                raise
+
+        # Файлы передаются потоком из Mattermost в Telegram
+        files = {f['id']: f for f in post_info.get('metadata', {}).get('files', [])}
+        attachments = []
+        for file_id in file_ids:
+            file_info = files.get(file_id) or await mattermost_service.get_file_info(file_id)
+            attachments.append(await attachment_service.send_to_telegram(session, ticket.telegram_id, file_id, file_info))
+
+        logger.debug("Сообщение отправлено пользователю %s", ticket.telegram_id)
+        MESSAGES_RELAYED.labels("to_user").inc()
+
+        # Добавляем сообщение в тикет (в Plane его доставит outbox)
         await ticket_service.add_message_to_ticket(
             session=session,
             ticket=ticket,
-            message_text=message_text,
-            sender_type="support"
+            message_text=message_text or ", ".join(f"📎 {a['filename']}" for a in attachments),
+            sender_type="support",
+            attachments=attachments
         )
+        # Пользователь видит ответ сразу, поэтому его история читается из основной БД
+        await replica_router.mark_write(ticket.telegram_id)
+
+# Очередь входящих вебхуков: обработчик только валидирует запрос и ставит пост в очередь
+webhook_queue = EventQueue(
+    name="mattermost_webhook",
+    handler=process_mattermost_post,
+    maxsize=settings.WEBHOOK_QUEUE_SIZE,
+    workers=settings.WEBHOOK_WORKERS,
+    # Вебхук уже получил ответ 200, поэтому Mattermost пост не повторит
+    retries=settings.WEBHOOK_RETRIES,
+    retry_base_delay=settings.WEBHOOK_RETRY_BASE_DELAY,
+    retry_max_delay=settings.WEBHOOK_RETRY_MAX_DELAY
+)
+
+async def enqueue_mattermost_post(post: Dict[str, Any]) -> None:
+    """Ставит в очередь пост, полученный через WebSocket"""
+    await webhook_queue.put_wait(post)
 
-        # Отправляем сообщение в Plane
-        plane_service = PlaneService()
-        await plane_service.update_ticket(ticket.plane_ticket_id, message_text, is_from_support=True)
+@router.post("/webhook/mattermost")
+async def mattermost_webhook(request: Request) -> Dict[str, str]:
+    """
+    Обработчик вебхуков от Mattermost.
+    Проверяет токен, ставит пост в очередь на обработку и сразу отвечает.
+    """
+    started = time.perf_counter()
+    try:
+        return await _accept_webhook(request)
+    finally:
+        WEBHOOK_LATENCY.labels("ack").observe(time.perf_counter() - started)
+
+async def _accept_webhook(request: Request) -> Dict[str, str]:
+    # Пробуем получить данные как JSON
+    try:
+        data_dict = await request.json()
+    except Exception:
+        # Если не получилось, пробуем как form-data
+        form_data = await request.form()
+        data_dict = dict(form_data)
+
+    # Токен в логи не попадает
+    logger.debug("Получен вебхук от Mattermost: post_id=%s channel_id=%s", data_dict.get('post_id'), data_dict.get('channel_id'))
 
-        return {"status": "ok", "message": "Message processed"}
+    # Проверяем токен
+    if data_dict.get('token') != settings.MATTERMOST_WEBHOOK_TOKEN:
+        logger.error("Неверный токен вебхука Mattermost")
+        raise HTTPException(status_code=403, detail="Invalid token")
 
-    except Exception as e:
-        logger.error(f"Ошибка при обработке вебхука: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    # Получаем информацию о посте
+    post_id = data_dict.get('post_id')
+    if not post_id:
+        raise HTTPException(status_code=400, detail="No post_id provided")
+
+    try:
+        webhook_queue.put(post_id)
+    except QueueFullError:
+        # Mattermost повторит запрос позже
+        logger.error("Очередь вебхуков переполнена, пост %s отклонен", post_id)
+        raise HTTPException(status_code=503, detail="Webhook queue is full")
+
+    return {"status": "ok", "message": "Message queued"}
+
+@router.get("/webhook/mattermost/stats")
+async def mattermost_webhook_stats() -> Dict[str, Any]:
+    """Глубина и задержка очереди вебхуков Mattermost"""
+    return webhook_queue.stats()
@@ -7,14 +7,15 @@ from bot.models.models import User
 from bot.fsm import UserRegistration, TicketCreation, TicketSelection
 from bot.keyboards import get_main_keyboard, get_tickets_keyboard
 from bot.services.ticket_service import TicketService
+from bot.services.user_cache import user_cache
 
 router = Router()
 ticket_service = TicketService()
 
-@router.message(Command("start"))
+@router.message(Command("start"), flags={"db": "readonly"})
 async def cmd_start(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка команды /start"""
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     
     if user:
         await message.answer(
@@ -79,6 +80,7 @@ async def process_shop(message: Message, state: FSMContext, session: AsyncSessio
     )
     session.add(new_user)
     await session.commit()
+    await user_cache.invalidate(message.from_user.id)
     
     await state.clear()
     await message.answer(
@@ -86,10 +88,10 @@ async def process_shop(message: Message, state: FSMContext, session: AsyncSessio
         reply_markup=get_main_keyboard()
     )
 
-@router.message(F.text == "Создать новую заявку")
+@router.message(F.text == "Создать новую заявку", flags={"db": "readonly"})
 async def create_new_ticket(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка нажатия кнопки создания новой заявки"""
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     if not user:
         await message.answer("Пожалуйста, начните с команды /start для регистрации.")
         return
@@ -99,29 +101,46 @@ async def create_new_ticket(message: Message, state: FSMContext, session: AsyncS
         "Пожалуйста, введите название заявки (не более 100 символов):"
     )
 
-@router.message(F.text == "Выбрать существующую заявку")
+@router.message(F.text == "Выбрать существующую заявку", flags={"db": "readonly"})
 async def select_existing_ticket(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка нажатия кнопки выбора существующей заявки"""
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     if not user:
         await message.answer("Пожалуйста, начните с команды /start для регистрации.")
         return
     
-    tickets = await ticket_service.get_active_tickets(session, user.id)
+    page = await ticket_service.get_tickets_page(session, user.id)
     
-    if not tickets:
+    if not page["tickets"]:
         await message.answer("У вас нет активных заявок.")
         return
     
-    tickets_data = ticket_service.format_tickets_for_keyboard(tickets)
-    
     await state.set_state(TicketSelection.selecting_ticket)
     await message.answer(
         "Выберите заявку:",
-        reply_markup=get_tickets_keyboard(tickets_data)
+        reply_markup=get_tickets_keyboard(page["tickets"], page["prev"], page["next"])
+    )
+
+@router.callback_query(F.data.startswith("tickets_page:"), flags={"db": "readonly"})
+async def process_tickets_page(callback: CallbackQuery, session: AsyncSession):
+    """Переход на другую страницу списка заявок"""
+    user = await ticket_service.get_user_profile(session, callback.from_user.id)
+    if not user:
+        await callback.answer("Пожалуйста, начните с команды /start для регистрации.")
+        return
+    
+    cursor = callback.data.split(":", 1)[1]
+    try:
+        page = await ticket_service.get_tickets_page(session, user.id, cursor)
+    except ValueError:
+        await callback.answer("Список устарел, откройте его заново")
+        return
+    await callback.message.edit_reply_markup(
+        reply_markup=get_tickets_keyboard(page["tickets"], page["prev"], page["next"])
     )
+    await callback.answer()
 
-@router.callback_query(F.data.startswith("ticket_"))
+@router.callback_query(F.data.startswith("ticket_"), flags={"db": "readonly"})
 async def process_ticket_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработка выбора тикета из списка"""
     ticket_id = int(callback.data.split("_")[1])
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Request, HTTPException, Header
+from aiogram.types import Update
+from typing import Dict, Optional
+import hmac
+import logging
+from bot.config import settings
+from bot.bot import bot
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/webhook/telegram")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(default=None)
+) -> Dict[str, str]:
+    """
+    Обработчик вебхуков от Telegram.
+    Проверяет секретный токен и передает обновление в Dispatcher.
+    Роутер подключается только в режиме webhook с заданным секретом.
+    """
+    if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token.encode(), settings.TELEGRAM_WEBHOOK_SECRET.encode()
+    ):
+        logger.error("Неверный секретный токен вебхука Telegram")
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+    await request.app.state.dp.feed_update(bot, update)
+    return {"status": "ok"}
@@ -5,13 +5,19 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.models.models import User
 from bot.services.ticket_service import TicketService
+from bot.services.attachments import attachment_from_message
+from bot.services.user_cache import UserProfile
+from bot.services import idempotency
 from bot.fsm import TicketCreation, TicketSelection
 from bot.keyboards import get_tickets_keyboard, get_confirmation_keyboard
+from typing import Any, Dict, List, Optional
+import logging
 
 router = Router()
+logger = logging.getLogger(__name__)
 ticket_service = TicketService()
 
-@router.message(TicketCreation.waiting_title)
+@router.message(TicketCreation.waiting_title, flags={"db": "readonly"})
 async def process_title(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка ввода названия тикета"""
     title = message.text.strip()
@@ -20,7 +26,7 @@ async def process_title(message: Message, state: FSMContext, session: AsyncSessi
         await message.answer("Название слишком длинное. Пожалуйста, введите название короче 100 символов:")
         return
     
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     if not user:
         await message.answer("Пожалуйста, начните с команды /start для регистрации.")
         await state.clear()
@@ -37,7 +43,7 @@ async def process_description(message: Message, state: FSMContext, session: Asyn
     title = data.get('title', '')
     
     # Создаем тикет в базе данных
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     if not user:
         await message.answer("Пожалуйста, начните с команды /start для регистрации.")
         await state.clear()
@@ -59,12 +65,17 @@ async def process_description(message: Message, state: FSMContext, session: Asyn
         )
     except Exception as e:
         await message.answer("Произошла ошибка при создании обращения. Пожалуйста, попробуйте позже.")
-        print(f"Error creating ticket: {e}")
+        logger.error("Error creating ticket: %s", e)
         await state.clear()
 
 @router.callback_query(F.data == "confirm_ticket")
 async def process_confirmation(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработка подтверждения создания тикета"""
+    # Telegram может доставить тот же callback повторно
+    if not await idempotency.claim(f"callback:{callback.id}"):
+        await callback.answer()
+        return
+
     data = await state.get_data()
     ticket_id = data.get('ticket_id')
     
@@ -73,27 +84,37 @@ async def process_confirmation(callback: CallbackQuery, state: FSMContext, sessi
         await state.clear()
         return
 
-    try:
-        # Получаем тикет
-        ticket = await ticket_service.get_ticket_by_id(session, ticket_id)
-        if not ticket:
-            await callback.message.edit_text("Тикет не найден. Пожалуйста, начните создание обращения заново.")
-            await state.clear()
-            return
+    # Получаем тикет
+    ticket = await ticket_service.get_ticket_by_id(session, ticket_id)
+    if not ticket:
+        await callback.message.edit_text("Тикет не найден. Пожалуйста, начните создание обращения заново.")
+        await state.clear()
+        return
 
-        # Отправляем тикет в Mattermost и Plane
-        await ticket_service.activate_ticket(session, ticket)
-        
+    try:
+        # Ставим создание тикета в Mattermost и Plane в outbox; при двойном нажатии
+        # это сделает только один вызов
+        activated = await ticket_service.activate_ticket(session, ticket)
+    except Exception as e:
+        # Активация - одна транзакция: при ошибке тикет остается неподтвержденным,
+        # поэтому его можно подтвердить еще раз или отменить
+        logger.error("Error activating ticket: %s", e)
         await callback.message.edit_text(
-            f"Обращение *#{ticket.id} {ticket.title}* создано. Мы ответим вам в течение 5 минут.\n"
-            "Вы можете продолжать отправлять сообщения, они будут добавлены к заявке.",
-            parse_mode="Markdown"
+            "Произошла ошибка при создании обращения. Попробуйте подтвердить еще раз или отмените создание.",
+            reply_markup=get_confirmation_keyboard()
         )
-    except Exception as e:
-        await callback.message.edit_text("Произошла ошибка при создании обращения. Пожалуйста, попробуйте позже.")
-        print(f"Error activating ticket: {e}")
-    finally:
-        await state.clear()
+        return
+
+    await state.clear()
+    if not activated and ticket.status != "active":
+        await callback.message.edit_text("Создание обращения было отменено.")
+        return
+    # Повторное подтверждение получает тот же ответ, что и первое
+    await callback.message.edit_text(
+        f"Обращение *#{ticket.id} {ticket.title}* создано. Мы ответим вам в течение 5 минут.\n"
+        "Вы можете продолжать отправлять сообщения, они будут добавлены к заявке.",
+        parse_mode="Markdown"
+    )
 
 @router.callback_query(F.data == "cancel_ticket")
 async def process_cancellation(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -105,11 +126,13 @@ async def process_cancellation(callback: CallbackQuery, state: FSMContext, sessi
         try:
             # Получаем тикет
             ticket = await ticket_service.get_ticket_by_id(session, ticket_id)
-            if ticket:
-                # Отменяем тикет
-                await ticket_service.cancel_ticket(session, ticket)
+            # Отменяем тикет, если его не успели подтвердить
+            if ticket and not await ticket_service.cancel_ticket(session, ticket) and ticket.status == "active":
+                await state.clear()
+                await callback.message.edit_text(f"Обращение *#{ticket.id} {ticket.title}* уже создано.", parse_mode="Markdown")
+                return
         except Exception as e:
-            print(f"Error canceling ticket: {e}")
+            logger.error("Error canceling ticket: %s", e)
     
     await state.clear()
     await callback.message.edit_text("Создание обращения отменено.")
@@ -117,11 +140,38 @@ async def process_cancellation(callback: CallbackQuery, state: FSMContext, sessi
 @router.message()
 async def process_message(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка всех остальных сообщений"""
-    user = await ticket_service.get_user_by_telegram_id(session, message.from_user.id)
+    user = await ticket_service.get_user_profile(session, message.from_user.id)
     if not user:
         await message.answer("Пожалуйста, начните с команды /start для регистрации.")
         return
 
+    # Фото и документы пересылаются вместе с подписью
+    attachment = attachment_from_message(message)
+    attachments = [attachment] if attachment else None
+    text = message.text or message.caption or (f"📎 {attachment['filename']}" if attachment else None)
+    if not text:
+        await message.answer("Можно отправить текст, фото или документ.")
+        return
+
+    # Повторно доставленное Telegram сообщение не должно попасть в заявку дважды
+    idempotency_key = f"message:{message.chat.id}:{message.message_id}"
+    if not await idempotency.claim(idempotency_key):
+        return
+    try:
+        await _relay_message(message, state, session, user, text, attachments)
+    except Exception:
+        await idempotency.release(idempotency_key)
+        raise
+
+async def _relay_message(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserProfile,
+    text: str,
+    attachments: Optional[List[Dict[str, Any]]]
+) -> None:
+    """Добавляет сообщение к выбранной или последней заявке"""
     state_data = await state.get_data()
     selected_ticket_id = state_data.get('selected_ticket_id')
     
@@ -129,14 +179,14 @@ async def process_message(message: Message, state: FSMContext, session: AsyncSes
         ticket = await ticket_service.get_ticket_by_id(session, selected_ticket_id)
         
         if ticket and ticket.status != 'closed':
-            await ticket_service.add_message_to_ticket(session, ticket, message.text)
+            await ticket_service.add_message_to_ticket(session, ticket, text, attachments=attachments)
             await message.answer("Сообщение добавлено к выбранной заявке.")
             return
     
     last_ticket = await ticket_service.get_last_ticket(session, user.id)
 
     if last_ticket and last_ticket.status != 'closed':
-        await ticket_service.add_message_to_ticket(session, last_ticket, message.text)
+        await ticket_service.add_message_to_ticket(session, last_ticket, text, attachments=attachments)
         await message.answer("Сообщение добавлено к текущей заявке.")
     else:
         await message.answer(
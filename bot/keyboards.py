@@ -1,5 +1,5 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Создает основную клавиатуру с кнопками"""
@@ -12,8 +12,12 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
     )
     return keyboard
 
-def get_tickets_keyboard(tickets: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
-    """Создает клавиатуру со списком тикетов"""
+def get_tickets_keyboard(
+    tickets: List[Dict[str, Any]],
+    prev_cursor: Optional[str] = None,
+    next_cursor: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Создает клавиатуру со списком тикетов и кнопками перехода между страницами"""
     keyboard = []
     for ticket in tickets:
         # Если title отсутствует, используем номер тикета
@@ -25,6 +29,14 @@ def get_tickets_keyboard(tickets: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
             callback_data=f"ticket_{ticket['id']}"
         )])
     
+    navigation = []
+    if prev_cursor:
+        navigation.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"tickets_page:{prev_cursor}"))
+    if next_cursor:
+        navigation.append(InlineKeyboardButton(text="Далее ➡️", callback_data=f"tickets_page:{next_cursor}"))
+    if navigation:
+        keyboard.append(navigation)
+    
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 def get_confirmation_keyboard() -> InlineKeyboardMarkup:
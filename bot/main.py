@@ -2,59 +2,116 @@ import asyncio
 import logging
 from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from bot.config import settings
 from bot.database import init_db, redis, close_db
-from bot.handlers import registration, tickets, mattermost
+from bot.handlers import registration, history, tickets, mattermost, telegram, admin
 from bot.middlewares.database import DatabaseMiddleware
+from bot.middlewares.metrics import MetricsMiddleware
+from bot.utils.metrics import render_metrics, CONTENT_TYPE_LATEST
+from bot.services.http import http_client
+from bot.services.outbox import outbox_worker
+from bot.services.broadcast import broadcast_service
+from bot.services.timers import timer_wheel
+from bot.services.replica import replica_router
+from bot.services.mattermost_ws import MattermostWebSocketListener
 from bot.bot import bot
+from bot.utils.log import setup_logging, stop_logging
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Без секрета любой мог бы отправить на вебхук поддельное обновление от имени пользователя
+if settings.TELEGRAM_MODE == "webhook" and not settings.TELEGRAM_WEBHOOK_SECRET:
+    raise RuntimeError("TELEGRAM_WEBHOOK_SECRET is required in webhook mode")
+
 app = FastAPI()
 storage = RedisStorage(redis=redis)
 dp = Dispatcher(storage=storage)
 polling_task = None
+mattermost_listener = None
 
 # Регистрация роутеров и middleware
 dp.include_router(registration.router)
+# До tickets: его обработчик без фильтров забирает все остальные сообщения
+dp.include_router(history.router)
 dp.include_router(tickets.router)
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
 dp.message.middleware(DatabaseMiddleware())
 dp.callback_query.middleware(DatabaseMiddleware())
 
-# Регистрация роутера для вебхуков Mattermost
+# Регистрация роутеров для вебхуков Mattermost и Telegram
 app.include_router(mattermost.router, prefix="/api")
+if settings.TELEGRAM_MODE == "webhook":
+    # При поллинге вебхук Telegram не нужен и не должен принимать запросы
+    app.include_router(telegram.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+app.state.dp = dp
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Метрики в формате Prometheus"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 @app.on_event("startup")
 async def startup_event():
-    global polling_task
+    global polling_task, mattermost_listener
     await init_db()
-    await bot.delete_webhook(drop_pending_updates=True)
-    polling_task = asyncio.create_task(dp.start_polling(bot))
-    logger.info("Бот запущен")
+    await replica_router.start()
+    await http_client.start()
+    await outbox_worker.start()
+    await mattermost.webhook_queue.start()
+    await broadcast_service.resume_pending()
+    await timer_wheel.start()
+    if settings.MATTERMOST_INGESTION_MODE == "websocket":
+        mattermost_listener = MattermostWebSocketListener(on_post=mattermost.enqueue_mattermost_post)
+        await mattermost_listener.start()
+    if settings.TELEGRAM_MODE == "webhook":
+        # Вызов идемпотентен, поэтому его можно выполнять в каждой реплике;
+        # накопленные обновления не сбрасываются
+        await bot.set_webhook(
+            url=f"{settings.TELEGRAM_WEBHOOK_URL}/api/webhook/telegram",
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info("Бот запущен в режиме webhook")
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
+        polling_task = asyncio.create_task(dp.start_polling(bot))
+        logger.info("Бот запущен")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    global polling_task
     logger.info("Начало процесса завершения работы...")
     
     try:
         # Останавливаем поллинг
-        await dp.stop_polling()
-        
         if polling_task:
+            await dp.stop_polling()
             polling_task.cancel()
             try:
                 await polling_task
             except asyncio.CancelledError:
                 pass
         
+        # Дожидаемся обработки вебхуков и текущих доставок
+        if mattermost_listener:
+            await mattermost_listener.stop()
+        await mattermost.webhook_queue.stop()
+        await timer_wheel.stop()
+        await outbox_worker.stop()
+        await broadcast_service.stop()
+        await replica_router.stop()
+        
         # Закрываем соединения
         await dp.storage.close()
         await bot.session.close()
+        await http_client.close()
         await close_db()
         
         logger.info("Завершение работы выполнено успешно")
     except Exception as e:
-        logger.error(f"Ошибка при завершении работы: {e}")
\ No newline at end of file
+        logger.error(f"Ошибка при завершении работы: {e}")
+    finally:
+        stop_logging()
\ No newline at end of file
@@ -1,16 +1,93 @@
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import AsyncSession
-from bot.database import async_session
+from bot.database import async_session, readonly_engine, replica_engine
+from bot.services.replica import replica_router
+
+class LazySession:
+    """
+    Сессия, создаваемая только при первом обращении обработчика к базе.
+
+    Обновления, которые обработчик обслуживает по состоянию FSM или из кэша,
+    не создают сессию и не занимают соединение пула.
+    """
+
+    def __init__(self, readonly: bool = False, replica: bool = False):
+        self.readonly = readonly
+        self.replica = replica
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def used(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            if self.replica:
+                self._session = async_session(bind=replica_engine)
+            elif self.readonly:
+                self._session = async_session(bind=readonly_engine)
+            else:
+                self._session = async_session()
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
 
 class DatabaseMiddleware(BaseMiddleware):
+    """
+    Передает обработчику ленивую сессию.
+
+    Обработчик, помеченный flags={"db": "readonly"}, получает сессию только
+    для чтения (запись отклоняет сервер) в режиме autocommit: на реплике, если она настроена, не отстает
+    и пользователь недавно ничего не записывал. После обработчика с записью
+    чтения этого пользователя на время уходят в основную БД.
+    """
+
+    # Счетчики общие для всех экземпляров middleware
+    updates_total = 0
+    updates_with_db = 0
+    updates_readonly = 0
+    updates_replica = 0
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with async_session() as session:
-            data['session'] = session
+        readonly = get_flag(data, "db") == "readonly"
+        user = data.get("event_from_user")
+        telegram_id = user.id if user else None
+        replica = readonly and await replica_router.use_replica(telegram_id)
+        session = LazySession(readonly=readonly, replica=replica)
+        data['session'] = session
+        try:
             return await handler(event, data)
+        finally:
+            DatabaseMiddleware.updates_total += 1
+            if session.used:
+                DatabaseMiddleware.updates_with_db += 1
+                if session.readonly:
+                    DatabaseMiddleware.updates_readonly += 1
+                if session.replica:
+                    DatabaseMiddleware.updates_replica += 1
+            await session.close()
+            if session.used and not session.readonly:
+                await replica_router.mark_write(telegram_id)
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """Сколько обновлений действительно обращались к базе"""
+        return {
+            "updates_total": cls.updates_total,
+            "updates_with_db": cls.updates_with_db,
+            "updates_readonly": cls.updates_readonly,
+            "updates_replica": cls.updates_replica,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Lock в asyncio справедливый, поэтому ожидающие получают токены по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class _ChatState:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(settings.TELEGRAM_CHAT_RATE, settings.TELEGRAM_CHAT_BURST)
+        self.users = 0
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Ограничивает исходящие запросы к Bot API.
+
+    Все запросы с chat_id проходят через глобальный token bucket и bucket
+    своего чата. Запросы одного чата выполняются строго по очереди (FIFO),
+    ответ 429 обрабатывается повтором через retry_after с сохранением порядка.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(settings.TELEGRAM_GLOBAL_RATE, settings.TELEGRAM_GLOBAL_RATE)
+        self._chats: Dict[Any, _ChatState] = {}
+        self._paused_until = 0.0
+        self.sent = 0
+        self.dequeued = 0
+        self.retries = 0
+        self.waiting = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+        state.users += 1
+        enqueued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            async with state.lock:
+                await state.bucket.acquire()
+                await self.global_bucket.acquire()
+                self._record_wait(time.monotonic() - enqueued_at)
+                self.waiting -= 1
+                enqueued_at = None
+                return await self._send(make_request, bot, method)
+        finally:
+            if enqueued_at is not None:
+                self.waiting -= 1
+            state.users -= 1
+            if state.users == 0:
+                self._chats.pop(chat_id, None)
+
+    async def _send(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot, method: TelegramMethod[TelegramType]) -> Any:
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                result = await make_request(bot, method)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                if attempt == settings.TELEGRAM_MAX_RETRIES:
+                    raise
+                self.retries += 1
+                # Flood control может быть глобальным, поэтому приостанавливаем все отправки
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning("Telegram 429 для чата %s, повтор через %s с", method.chat_id, e.retry_after)
+
+    def _record_wait(self, wait: float) -> None:
+        self.dequeued += 1
+        self.wait_time_total += wait
+        self.wait_time_max = max(self.wait_time_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика очереди исходящих запросов"""
+        return {
+            "sent": self.sent,
+            "retries": self.retries,
+            "waiting": self.waiting,
+            "active_chats": len(self._chats),
+            "wait_time_avg_seconds": round(self.wait_time_total / self.dequeued, 6) if self.dequeued else 0.0,
+            "wait_time_max_seconds": round(self.wait_time_max, 6),
+        }
+
+# Общий для бота ограничитель
+rate_limiter = RateLimitMiddleware()
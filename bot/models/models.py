@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON, Index, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from ..database import Base
 
@@ -16,6 +17,11 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     
     tickets = relationship("Ticket", back_populates="user")
+    
+    __table_args__ = (
+        # Выборка получателей рассылки по компании/магазину в порядке id
+        Index("ix_users_company_shop_id", "company", "shop", "id"),
+    )
 
 class Ticket(Base):
     __tablename__ = "tickets"
@@ -29,9 +35,29 @@ class Ticket(Base):
     status = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
+    # Полнотекстовый индекс заголовка и описания, заполняется триггером в БД
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     
     user = relationship("User", back_populates="tickets")
     messages = relationship("Message", back_populates="ticket")
+    
+    __table_args__ = (
+        # get_last_ticket и сортировка списков тикетов пользователя
+        Index("ix_tickets_user_id_created_at", "user_id", created_at.desc()),
+        # Постраничный список незакрытых тикетов пользователя (keyset по created_at, id)
+        Index(
+            "ix_tickets_user_id_created_at_id_open",
+            "user_id", created_at.desc(), id.desc(),
+            postgresql_where=(status != "closed")
+        ),
+        # Поиск тикета по треду Mattermost при каждом вебхуке
+        Index(
+            "ix_tickets_mattermost_post_id",
+            "mattermost_post_id",
+            postgresql_where=(mattermost_post_id.isnot(None))
+        ),
+        Index("ix_tickets_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -41,5 +67,136 @@ class Message(Base):
     sender_type = Column(String, nullable=False)  # "user" или "support"
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Полнотекстовый индекс текста сообщения, заполняется триггером в БД
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     
     ticket = relationship("Ticket", back_populates="messages")
+    
+    __table_args__ = (
+        # История тикета (keyset по created_at, id) и время последнего сообщения
+        Index("ix_messages_ticket_id_created_at_id", "ticket_id", "created_at", "id"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+class OutboxJob(Base):
+    """Задание на доставку в Plane/Mattermost (transactional outbox)"""
+    __tablename__ = "outbox_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
+    lane = Column(String, nullable=False)  # "mattermost" или "plane": порядок соблюдается внутри (ticket_id, lane)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="pending")  # "pending", "done" или "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index(
+            "ix_outbox_jobs_pending",
+            "ticket_id", "lane", "id",
+            postgresql_where=(status == "pending")
+        ),
+    )
+
+class Attachment(Base):
+    """Вложение сообщения тикета (фото или документ)"""
+    __tablename__ = "attachments"
+    
+    id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
+    file_unique_id = Column(String, nullable=True)  # Постоянный id файла в Telegram, по нему отсекаются повторы
+    telegram_file_id = Column(String, nullable=True)
+    mattermost_file_id = Column(String, nullable=True)
+    plane_asset_id = Column(String, nullable=True)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_attachments_message_id", "message_id"),
+        Index("ix_attachments_ticket_id_file_unique_id", "ticket_id", "file_unique_id"),
+        Index("ix_attachments_mattermost_file_id", "mattermost_file_id"),
+    )
+
+class Broadcast(Base):
+    """Массовая рассылка пользователям компании и/или магазина"""
+    __tablename__ = "broadcasts"
+    
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    company = Column(String, nullable=True)
+    shop = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="running")  # "running", "finished" или "canceled"
+    last_user_id = Column(Integer, nullable=False, default=0)  # Курсор: все пользователи с меньшим id обработаны
+    sent = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    locked_until = Column(DateTime, nullable=True)  # Аренда рассылки одной репликой
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    failures = relationship("BroadcastFailure", back_populates="broadcast")
+
+class BroadcastFailure(Base):
+    """Получатель, которому не удалось доставить рассылку"""
+    __tablename__ = "broadcast_failures"
+    
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    telegram_id = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)  # "blocked" или "failed"
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    broadcast = relationship("Broadcast", back_populates="failures")
+
+# Конфигурация полнотекстового поиска
+SEARCH_CONFIG = "russian"
+
+# Триггеры, поддерживающие search_vector в актуальном состоянии при каждой вставке
+# и изменении текста (те же, что создает миграция, для init_db/create_all)
+TICKETS_SEARCH_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION tickets_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TICKETS_SEARCH_TRIGGER = """
+CREATE TRIGGER tickets_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_search_vector_update()
+"""
+
+MESSAGES_SEARCH_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.content, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+MESSAGES_SEARCH_TRIGGER = """
+CREATE TRIGGER messages_search_vector_update
+    BEFORE INSERT OR UPDATE OF content ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()
+"""
+
+for table, statements in (
+    (Ticket.__table__, (TICKETS_SEARCH_FUNCTION, TICKETS_SEARCH_TRIGGER)),
+    (Message.__table__, (MESSAGES_SEARCH_FUNCTION, MESSAGES_SEARCH_TRIGGER)),
+):
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement))
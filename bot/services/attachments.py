@@ -0,0 +1,205 @@
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiogram.types import Message, URLInputFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.bot import bot
+from bot.config import settings
+from bot.models.models import Attachment
+from bot.services.mattermost import MattermostService
+from bot.services.plane import PlaneService
+
+logger = logging.getLogger(__name__)
+
+# Mattermost принимает не больше 5 файлов в одном посте
+MATTERMOST_FILES_PER_POST = 5
+# Больше этого размера Telegram не примет файл как фото
+TELEGRAM_PHOTO_MAX_SIZE = 10 * 1024 * 1024
+# Файлы больше этого размера Bot API не отдает (getFile)
+TELEGRAM_DOWNLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+def attachment_from_message(message: Message) -> Optional[Dict[str, Any]]:
+    """Описание фото или документа из сообщения Telegram"""
+    if message.photo:
+        # Последний размер - самый крупный
+        photo = message.photo[-1]
+        return {
+            "file_unique_id": photo.file_unique_id,
+            "telegram_file_id": photo.file_id,
+            "filename": f"photo_{photo.file_unique_id}.jpg",
+            "content_type": "image/jpeg",
+            "size": photo.file_size
+        }
+    if message.document:
+        document = message.document
+        return {
+            "file_unique_id": document.file_unique_id,
+            "telegram_file_id": document.file_id,
+            "filename": document.file_name or f"document_{document.file_unique_id}",
+            "content_type": document.mime_type,
+            "size": document.file_size
+        }
+    return None
+
+class AttachmentService:
+    """
+    Потоковая пересылка вложений между Telegram, Mattermost и Plane.
+
+    Файлы передаются чанками из ответа одного API прямо в запрос к другому,
+    целиком в памяти или на диске они не хранятся. Повторно отправленный
+    в тот же тикет файл (тот же file_unique_id) заново не загружается.
+    """
+
+    def __init__(self):
+        self.mattermost_service = MattermostService()
+        self.plane_service = PlaneService()
+
+    async def for_messages(self, session: AsyncSession, message_ids: List[int]) -> List[Attachment]:
+        """Вложения сообщений в порядке добавления"""
+        return list(await session.scalars(
+            select(Attachment)
+            .where(Attachment.message_id.in_(message_ids))
+            .order_by(Attachment.id)
+        ))
+
+    async def _telegram_stream(self, file_id: str) -> AsyncIterator[bytes]:
+        file = await bot.get_file(file_id)
+        url = bot.session.api.file_url(bot.token, file.file_path)
+        async for chunk in bot.session.stream_content(url, chunk_size=settings.ATTACHMENT_CHUNK_SIZE, raise_for_status=True):
+            yield chunk
+
+    @staticmethod
+    def _too_large(attachment: Attachment) -> bool:
+        """Файл из Telegram, который Bot API не даст скачать"""
+        return (
+            not attachment.mattermost_file_id
+            and attachment.telegram_file_id is not None
+            and (attachment.size or 0) > TELEGRAM_DOWNLOAD_MAX_SIZE
+        )
+
+    def _stream(self, attachment: Attachment) -> AsyncIterator[bytes]:
+        """Поток содержимого из того источника, где файл уже есть"""
+        if attachment.telegram_file_id:
+            return self._telegram_stream(attachment.telegram_file_id)
+        return self.mattermost_service.download_file(attachment.mattermost_file_id)
+
+    async def _is_duplicate(self, session: AsyncSession, attachment: Attachment, column) -> bool:
+        """Был ли этот файл уже отправлен в тикет раньше"""
+        if not attachment.file_unique_id:
+            return False
+        return await session.scalar(
+            select(Attachment.id)
+            .where(
+                Attachment.ticket_id == attachment.ticket_id,
+                Attachment.file_unique_id == attachment.file_unique_id,
+                Attachment.id < attachment.id,
+                column.is_not(None)
+            )
+            .limit(1)
+        ) is not None
+
+    async def upload_to_mattermost(self, session: AsyncSession, attachments: List[Attachment]) -> Tuple[List[str], List[str]]:
+        """
+        Загружает вложения в Mattermost.
+
+        Файл, который не удалось загрузить, не мешает остальным и тексту
+        сообщения: вместо него в пост попадает примечание.
+
+        Returns:
+            id загруженных файлов и примечания о пропущенных файлах
+        """
+        file_ids: List[str] = []
+        notes: List[str] = []
+        for attachment in attachments:
+            # Файл мог быть загружен при предыдущей попытке задания
+            if not attachment.mattermost_file_id:
+                if await self._is_duplicate(session, attachment, Attachment.mattermost_file_id):
+                    notes.append(f"Файл {attachment.filename} уже был отправлен ранее")
+                    continue
+                if self._too_large(attachment):
+                    notes.append(f"Файл {attachment.filename} больше 20 МБ, бот не может его получить из Telegram")
+                    continue
+                try:
+                    attachment.mattermost_file_id = await self.mattermost_service.upload_file(
+                        attachment.filename,
+                        self._stream(attachment),
+                        attachment.content_type
+                    )
+                except Exception as e:
+                    logger.warning("Не удалось загрузить вложение %s в Mattermost: %s", attachment.id, e)
+                    notes.append(f"Файл {attachment.filename} не удалось передать")
+                    continue
+            file_ids.append(attachment.mattermost_file_id)
+        return file_ids, notes
+
+    async def upload_to_plane(self, session: AsyncSession, plane_ticket_id: str, attachments: List[Attachment]) -> None:
+        """Прикрепляет вложения к задаче Plane; файл, который не удалось загрузить, пропускается"""
+        for attachment in attachments:
+            if attachment.plane_asset_id:
+                continue
+            if await self._is_duplicate(session, attachment, Attachment.plane_asset_id):
+                continue
+            if self._too_large(attachment):
+                logger.warning("Вложение %s больше 20 МБ и не может быть получено из Telegram", attachment.id)
+                continue
+            try:
+                attachment.plane_asset_id = await self.plane_service.upload_attachment(
+                    plane_ticket_id,
+                    attachment.filename,
+                    self._stream(attachment),
+                    attachment.content_type,
+                    attachment.size
+                )
+            except Exception as e:
+                logger.warning("Не удалось загрузить вложение %s в Plane: %s", attachment.id, e)
+
+    async def send_to_telegram(self, session: AsyncSession, chat_id: int, file_id: str, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Отправляет файл из Mattermost пользователю Telegram.
+
+        Файл, уже однажды отправленный в Telegram, пересылается по file_id
+        без повторной загрузки. Возвращает описание вложения для сохранения.
+        """
+        filename = file_info.get("name") or file_id
+        content_type = file_info.get("mime_type")
+        size = file_info.get("size")
+
+        known = await session.scalar(
+            select(Attachment.telegram_file_id)
+            .where(
+                Attachment.mattermost_file_id == file_id,
+                Attachment.telegram_file_id.is_not(None)
+            )
+            .limit(1)
+        )
+        document = known or URLInputFile(
+            self.mattermost_service.file_url(file_id),
+            headers=self.mattermost_service.auth_headers,
+            filename=filename,
+            chunk_size=settings.ATTACHMENT_CHUNK_SIZE
+        )
+
+        as_photo = (
+            content_type in ("image/jpeg", "image/png", "image/webp")
+            and (size or 0) <= TELEGRAM_PHOTO_MAX_SIZE
+        )
+        if as_photo:
+            sent = await bot.send_photo(chat_id=chat_id, photo=document)
+            telegram_file = sent.photo[-1]
+        else:
+            sent = await bot.send_document(chat_id=chat_id, document=document)
+            telegram_file = sent.document
+
+        return {
+            "file_unique_id": telegram_file.file_unique_id,
+            "telegram_file_id": telegram_file.file_id,
+            "mattermost_file_id": file_id,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size
+        }
+
+# Общий экземпляр сервиса
+attachment_service = AttachmentService()
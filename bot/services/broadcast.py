@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.bot import bot
+from bot.config import settings
+from bot.database import async_session
+from bot.models.models import User, Broadcast, BroadcastFailure
+
+logger = logging.getLogger(__name__)
+
+class BroadcastService:
+    """
+    Массовые рассылки по компании и/или магазину.
+
+    Получатели читаются из базы серверным курсором пачками по
+    BROADCAST_BATCH_SIZE, пачка отправляется параллельно (скорость ограничивает
+    общий ограничитель Telegram), после каждой пачки курсор и счетчики
+    сохраняются. Прерванная рассылка продолжается с сохраненного курсора,
+    повторно может быть отправлена только последняя незавершенная пачка.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def create(self, session: AsyncSession, text: str, company: Optional[str] = None, shop: Optional[str] = None) -> Broadcast:
+        """Создает рассылку и запускает ее"""
+        broadcast = Broadcast(
+            text=text,
+            company=company,
+            shop=shop,
+            status="running",
+            last_user_id=0,
+            sent=0,
+            blocked=0,
+            failed=0
+        )
+        session.add(broadcast)
+        await session.commit()
+        await session.refresh(broadcast)
+        await self.resume(broadcast.id)
+        return broadcast
+
+    async def resume(self, broadcast_id: int) -> bool:
+        """Запускает или продолжает рассылку, если ее не выполняет другая реплика"""
+        if broadcast_id in self._tasks:
+            return False
+        if not await self._claim(broadcast_id):
+            return False
+        self._tasks[broadcast_id] = asyncio.create_task(self._run(broadcast_id))
+        return True
+
+    async def resume_pending(self) -> None:
+        """Продолжает все незавершенные рассылки (вызывается при старте)"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            ids = list(await session.scalars(
+                select(Broadcast.id).where(
+                    Broadcast.status == "running",
+                    or_(Broadcast.locked_until.is_(None), Broadcast.locked_until < now)
+                )
+            ))
+        for broadcast_id in ids:
+            if await self.resume(broadcast_id):
+                logger.info("Рассылка %s продолжена после перезапуска", broadcast_id)
+
+    async def cancel(self, session: AsyncSession, broadcast: Broadcast) -> None:
+        """Отменяет рассылку"""
+        broadcast.status = "canceled"
+        await session.commit()
+        task = self._tasks.get(broadcast.id)
+        if task:
+            task.cancel()
+
+    async def stop(self) -> None:
+        """Останавливает рассылки этой реплики; они будут продолжены после рестарта"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Освобождаем аренду, чтобы рассылку сразу подхватила другая реплика
+        ids = list(self._tasks.keys())
+        self._tasks.clear()
+        if ids:
+            async with async_session() as session:
+                await session.execute(update(Broadcast).where(Broadcast.id.in_(ids)).values(locked_until=None))
+                await session.commit()
+
+    async def _claim(self, broadcast_id: int) -> bool:
+        """Берет рассылку в аренду (обновляется после каждой пачки)"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status == "running",
+                    or_(Broadcast.locked_until.is_(None), Broadcast.locked_until < now)
+                )
+                .values(locked_until=now + timedelta(seconds=settings.BROADCAST_LEASE_TIME))
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def _run(self, broadcast_id: int) -> None:
+        try:
+            async with async_session() as session:
+                broadcast = await session.get(Broadcast, broadcast_id)
+                query = select(User.id, User.telegram_id).where(
+                    User.is_active.is_(True),
+                    User.id > broadcast.last_user_id
+                )
+                if broadcast.company:
+                    query = query.where(User.company == broadcast.company)
+                if broadcast.shop:
+                    query = query.where(User.shop == broadcast.shop)
+                query = query.order_by(User.id).execution_options(yield_per=settings.BROADCAST_BATCH_SIZE)
+
+                # Отдельная сессия держит серверный курсор, прогресс пишется в основную
+                async with async_session() as cursor_session:
+                    result = await cursor_session.stream(query)
+                    async for batch in result.partitions():
+                        await session.refresh(broadcast)
+                        if broadcast.status != "running":
+                            logger.info("Рассылка %s остановлена: %s", broadcast_id, broadcast.status)
+                            return
+                        await self._send_batch(session, broadcast, batch)
+
+                broadcast.status = "finished"
+                broadcast.finished_at = datetime.utcnow()
+                broadcast.locked_until = None
+                await session.commit()
+                logger.info(
+                    "Рассылка %s завершена: отправлено %s, заблокировали бота %s, ошибок %s",
+                    broadcast_id, broadcast.sent, broadcast.blocked, broadcast.failed
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка при выполнении рассылки %s: %s", broadcast_id, e)
+        finally:
+            self._tasks.pop(broadcast_id, None)
+
+    async def _send_batch(self, session: AsyncSession, broadcast: Broadcast, batch: List[Tuple[int, int]]) -> None:
+        results = await asyncio.gather(
+            *(self._send_one(broadcast.text, telegram_id) for _, telegram_id in batch)
+        )
+        for (user_id, telegram_id), (reason, error) in zip(batch, results):
+            if reason is None:
+                broadcast.sent += 1
+                continue
+            if reason == "blocked":
+                broadcast.blocked += 1
+            else:
+                broadcast.failed += 1
+            session.add(BroadcastFailure(
+                broadcast_id=broadcast.id,
+                user_id=user_id,
+                telegram_id=telegram_id,
+                reason=reason,
+                error=error
+            ))
+        broadcast.last_user_id = batch[-1][0]
+        broadcast.locked_until = datetime.utcnow() + timedelta(seconds=settings.BROADCAST_LEASE_TIME)
+        await session.commit()
+
+    async def _send_one(self, text: str, telegram_id: int) -> Tuple[Optional[str], Optional[str]]:
+        """Отправляет сообщение, возвращает (причина неудачи, текст ошибки)"""
+        try:
+            await bot.send_message(chat_id=telegram_id, text=text)
+            return None, None
+        except TelegramForbiddenError as e:
+            return "blocked", str(e)
+        except Exception as e:
+            return "failed", str(e)
+
+# Общий экземпляр сервиса
+broadcast_service = BroadcastService()
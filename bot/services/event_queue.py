@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Очередь событий переполнена"""
+
+class EventQueue:
+    """
+    Ограниченная in-process очередь событий с пулом воркеров.
+
+    Позволяет HTTP-обработчику только поставить событие в очередь и сразу
+    ответить, а всю обработку выполнять в фоне. Считает глубину очереди
+    и задержку (время от постановки события до начала его обработки).
+
+    Событие, обработка которого завершилась ошибкой, ставится в очередь
+    повторно с экспоненциальной задержкой, до retries раз: источник уже
+    получил ответ и сам событие не повторит.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[None]],
+        maxsize: int,
+        workers: int,
+        retries: int = 0,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 60.0
+    ):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_timers: Set[asyncio.TimerHandle] = set()
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def put(self, event: Any) -> None:
+        """Ставит событие в очередь без ожидания"""
+        if self._queue is None:
+            raise RuntimeError(f"Queue {self.name} is not started")
+        try:
+            self._queue.put_nowait((time.monotonic(), event, 0))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"Queue {self.name} is full")
+
+    async def put_wait(self, event: Any) -> None:
+        """Ставит событие в очередь, ожидая свободного места (для источников с обратным давлением)"""
+        if self._queue is None:
+            raise RuntimeError(f"Queue {self.name} is not started")
+        await self._queue.put((time.monotonic(), event, 0))
+
+    async def start(self) -> None:
+        """Запускает воркеры"""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run(n)))
+        logger.info("Очередь %s: запущено воркеров %s", self.name, self.workers)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается обработки накопленных событий и останавливает воркеры"""
+        if self._retry_timers:
+            logger.warning("Очередь %s: отменено отложенных повторов при остановке: %s", self.name, len(self._retry_timers))
+            for timer in self._retry_timers:
+                timer.cancel()
+            self._retry_timers.clear()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Очередь %s: не обработано событий при остановке: %s", self.name, self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, n: int) -> None:
+        while True:
+            enqueued_at, event, attempt = await self._queue.get()
+            self.last_lag = time.monotonic() - enqueued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                if attempt < self.retries:
+                    delay = min(self.retry_base_delay * (2 ** attempt), self.retry_max_delay)
+                    logger.warning(
+                        "Очередь %s, воркер %s: ошибка при обработке события (%s), повтор %s через %s с",
+                        self.name, n, e, attempt + 1, delay
+                    )
+                    self._schedule_retry(event, attempt + 1, delay)
+                else:
+                    logger.error("Очередь %s, воркер %s: ошибка при обработке события: %s", self.name, n, e)
+            finally:
+                self._queue.task_done()
+
+    def _schedule_retry(self, event: Any, attempt: int, delay: float) -> None:
+        def retry() -> None:
+            self._retry_timers.discard(timer)
+            try:
+                self._queue.put_nowait((time.monotonic(), event, attempt))
+                self.retried += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.error("Очередь %s переполнена, повтор события отброшен", self.name)
+
+        timer = asyncio.get_running_loop().call_later(delay, retry)
+        self._retry_timers.add(timer)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает текущую статистику очереди"""
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "pending_retries": len(self._retry_timers),
+            "last_lag_seconds": round(self.last_lag, 3),
+            "max_lag_seconds": round(self.max_lag, 3),
+        }
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Dict
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Общий для приложения HTTP-клиент.
+
+    Для каждого внешнего хоста (Plane, Mattermost, ...) держит отдельную
+    долгоживущую aiohttp-сессию со своим пулом keep-alive соединений,
+    поэтому DNS, TCP и TLS не повторяются на каждый запрос.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @staticmethod
+    def _origin(base_url: str) -> str:
+        """Возвращает scheme://host[:port] для базового URL"""
+        if "://" not in base_url:
+            base_url = f"https://{base_url}"
+        parts = urlsplit(base_url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @staticmethod
+    def _host_limit(host: str) -> int:
+        """Лимит соединений для хоста с учетом переопределений из настроек"""
+        return settings.HTTP_HOST_LIMITS.get(host, settings.HTTP_LIMIT_PER_HOST)
+
+    def _create_session(self, origin: str) -> aiohttp.ClientSession:
+        host = urlsplit(origin).hostname or origin
+        connector = aiohttp.TCPConnector(
+            limit=self._host_limit(host),
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TOTAL_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+        )
+        logger.info("Открыт пул HTTP-соединений для %s (limit=%s)", origin, connector.limit)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def start(self) -> None:
+        """Подготавливает клиент к работе (вызывается при старте приложения)"""
+        self._closed = False
+
+    async def get_session(self, base_url: str) -> aiohttp.ClientSession:
+        """Возвращает общую сессию для хоста, создавая ее при первом обращении"""
+        origin = self._origin(base_url)
+        session = self._sessions.get(origin)
+        if session is not None and not session.closed:
+            return session
+
+        async with self._lock:
+            session = self._sessions.get(origin)
+            if session is None or session.closed:
+                if self._closed:
+                    raise RuntimeError("HTTP client is closed")
+                session = self._create_session(origin)
+                self._sessions[origin] = session
+            return session
+
+    async def close(self) -> None:
+        """Закрывает все сессии и пулы соединений"""
+        self._closed = True
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+        if sessions:
+            # Даем время корректно закрыть SSL-соединения
+            await asyncio.sleep(0.25)
+
+
+# Общий экземпляр клиента
+http_client = HttpClient()
+
+
+async def get_http_session(base_url: str) -> aiohttp.ClientSession:
+    """Возвращает общую сессию для указанного хоста"""
+    return await http_client.get_session(base_url)
@@ -0,0 +1,31 @@
+import logging
+from typing import Optional
+
+from bot.config import settings
+from bot.database import redis
+
+logger = logging.getLogger(__name__)
+
+def _key(key: str) -> str:
+    return f"idem:{key}"
+
+async def claim(key: str, ttl: Optional[int] = None) -> bool:
+    """
+    Отмечает операцию с ключом key как выполняемую.
+
+    Возвращает False, если ключ уже занят другим вызовом (на этой или другой
+    реплике). Если Redis недоступен, операция разрешается: лучше повтор,
+    чем потерянное сообщение.
+    """
+    try:
+        return bool(await redis.set(_key(key), "1", nx=True, ex=ttl or settings.IDEMPOTENCY_TTL))
+    except Exception as e:
+        logger.warning("Redis недоступен для ключа идемпотентности %s: %s", key, e)
+        return True
+
+async def release(key: str) -> None:
+    """Освобождает ключ после неудачной операции, чтобы повтор был выполнен"""
+    try:
+        await redis.delete(_key(key))
+    except Exception as e:
+        logger.warning("Не удалось освободить ключ идемпотентности %s: %s", key, e)
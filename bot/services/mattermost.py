@@ -1,108 +1,173 @@
-from mattermostdriver import Driver
 from bot.config import settings
+from bot.services.http import get_http_session
+from bot.utils.metrics import observe_call
+from typing import Any, AsyncIterator, Dict, List, Optional
 import aiohttp
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+class MattermostAPIError(Exception):
+    """Ошибка при обращении к API Mattermost"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Mattermost API error {status}: {message}")
+        self.status = status
+
 class MattermostService:
     def __init__(self):
-        self.client = Driver({
-            'url': settings.MATTERMOST_URL,
-            'token': settings.MATTERMOST_TOKEN,
-            'scheme': 'https',
-            'port': 443
-        })
         self.team_id = settings.MATTERMOST_TEAM
         self.channel_id = settings.MATTERMOST_CHANNEL
         self.base_url = settings.MATTERMOST_URL
+        # MATTERMOST_URL может быть указан как с протоколом, так и без (тогда https)
+        origin = self.base_url if "://" in self.base_url else f"https://{self.base_url}"
+        self.api_url = f"{origin.rstrip('/')}/api/v4"
         self.token = settings.MATTERMOST_TOKEN
+        # Персональный токен используется как bearer без отдельного login()
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
         self.bot_user_id = settings.MATTERMOST_SUPPORT_USER_ID
-        
+
     def is_bot_message(self, user_id: str) -> bool:
         """Проверяет, является ли сообщение от бота"""
         return user_id == self.bot_user_id
-        
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        """Выполняет запрос к API Mattermost через общий пул соединений"""
+        session = await get_http_session(self.base_url)
+        headers = kwargs.pop("headers", self.headers)
+        async with session.request(method, f"{self.api_url}{path}", headers=headers, **kwargs) as response:
+            if response.status >= 400:
+                raise MattermostAPIError(response.status, await response.text())
+            return await response.json()
+
+    @observe_call("mattermost", "create_post")
+    async def create_post(
+        self,
+        message: str,
+        root_id: Optional[str] = None,
+        file_ids: Optional[List[str]] = None,
+        props: Optional[Dict[str, Any]] = None
+    ) -> dict:
+        """Создает пост в канале поддержки (или ответ в треде, если указан root_id)"""
+        data = {
+            'channel_id': self.channel_id,
+            'message': message,
+            'props': props or {}
+        }
+        if root_id:
+            data['root_id'] = root_id
+        if file_ids:
+            data['file_ids'] = file_ids
+        return await self._request("POST", "/posts", json=data)
+
     async def create_thread(self, title: str, message: str) -> str:
         """Создает новую тему в Mattermost"""
         try:
-            self.client.login()
-            post = self.client.posts.create_post({
-                'channel_id': self.channel_id,
-                'message': f"### {title}\n{message}",
-                'props': {'from_bot': True}
-            })
+            post = await self.create_post(
+                f"### {title}\n{message}",
+                props={'from_bot': True}
+            )
             return post['id']
         except Exception as e:
             raise Exception(f"Failed to create Mattermost thread: {str(e)}")
-        
-    async def add_comment(self, thread_id: str, message: str, is_bot: bool = False):
+
+    async def add_comment(self, thread_id: str, message: str, is_bot: bool = False, file_ids: Optional[List[str]] = None):
         """Добавляет комментарий в существующую тему"""
         try:
-            self.client.login()
-            self.client.posts.create_post({
-                'channel_id': self.channel_id,
-                'message': message,
-                'root_id': thread_id,
-                'props': {'from_bot': is_bot}
-            })
+            return await self.create_post(
+                message,
+                root_id=thread_id,
+                file_ids=file_ids,
+                props={'from_bot': is_bot}
+            )
         except Exception as e:
             raise Exception(f"Failed to add comment to Mattermost thread: {str(e)}")
 
+    @observe_call("mattermost", "delete_post")
+    async def delete_post(self, post_id: str) -> None:
+        """Удаляет пост (используется для компенсации при неудачной активации тикета)"""
+        await self._request("DELETE", f"/posts/{post_id}")
+
+    @observe_call("mattermost", "upload_file")
+    async def upload_file(self, filename: str, content: Any, content_type: Optional[str] = None) -> str:
+        """
+        Загружает файл в канал поддержки и возвращает его id.
+
+        Args:
+            filename: Имя файла
+            content: bytes, файловый объект или асинхронный итератор чанков
+            content_type: MIME-тип файла
+
+        Returns:
+            str: id файла для передачи в file_ids поста
+        """
+        form = aiohttp.FormData()
+        form.add_field('channel_id', self.channel_id)
+        form.add_field('files', content, filename=filename, content_type=content_type)
+        # Content-Type для multipart формирует aiohttp
+        result = await self._request("POST", "/files", data=form, headers=self.auth_headers)
+        return result['file_infos'][0]['id']
+
+    def file_url(self, file_id: str) -> str:
+        """URL для скачивания файла"""
+        return f"{self.api_url}/files/{file_id}"
+
+    @property
+    def auth_headers(self) -> Dict[str, str]:
+        """Заголовки авторизации без Content-Type (для файлов)"""
+        return {"Authorization": f"Bearer {self.token}"}
+
+    @observe_call("mattermost", "get_file_info")
+    async def get_file_info(self, file_id: str) -> dict:
+        """Имя, MIME-тип и размер файла"""
+        return await self._request("GET", f"/files/{file_id}/info")
+
+    async def download_file(self, file_id: str) -> AsyncIterator[bytes]:
+        """Скачивает файл по частям, не загружая его в память целиком"""
+        session = await get_http_session(self.base_url)
+        async with session.get(self.file_url(file_id), headers=self.auth_headers) as response:
+            if response.status >= 400:
+                raise MattermostAPIError(response.status, await response.text())
+            async for chunk in response.content.iter_chunked(settings.ATTACHMENT_CHUNK_SIZE):
+                yield chunk
+
+    @observe_call("mattermost", "get_post", none_is_error=True)
     async def get_post(self, post_id: str, max_retries: int = 5, delay: float = 2.0) -> dict:
         """Получает информацию о посте через API Mattermost с повторными попытками"""
-        url = f"https://{self.base_url}/api/v4/posts/{post_id}"
-        logger.info(f"Отправка запроса к Mattermost API: {url}")
-        logger.info(f"Заголовки запроса: {self.headers}")
-        
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=self.headers) as response:
-                        response_text = await response.text()
-                        logger.info(f"Попытка {attempt + 1}/{max_retries}")
-                        logger.info(f"Статус ответа: {response.status}")
-                        logger.info(f"Тело ответа: {response_text}")
-                        
-                        if response.status == 200:
-                            return await response.json()
-                        elif response.status == 404 and attempt < max_retries - 1:
-                            logger.info(f"Пост {post_id} еще не создан, ожидание {delay} секунд...")
-                            await asyncio.sleep(delay)
-                            continue
-                        else:
-                            logger.error(f"Ошибка при получении поста {post_id}: {response.status}")
-                            return None
-                            
+                return await self._request("GET", f"/posts/{post_id}")
+            except MattermostAPIError as e:
+                if e.status == 404 and attempt < max_retries - 1:
+                    logger.debug("Пост %s еще не создан, ожидание %s секунд...", post_id, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error("Ошибка при получении поста %s: %s", post_id, e.status)
+                return None
             except Exception as e:
-                logger.error(f"Ошибка при запросе к Mattermost API (попытка {attempt + 1}): {e}")
+                logger.error("Ошибка при запросе к Mattermost API (попытка %s): %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     await asyncio.sleep(delay)
                     continue
                 return None
-                
-        logger.error(f"Не удалось получить пост {post_id} после {max_retries} попыток")
+
+        logger.error("Не удалось получить пост %s после %s попыток", post_id, max_retries)
         return None
 
+    @observe_call("mattermost", "get_user", none_is_error=True)
     async def get_user(self, user_id: str) -> dict:
         """Получает информацию о пользователе через API Mattermost"""
-        url = f"https://{self.base_url}/api/v4/users/{user_id}"
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logger.error(f"Ошибка при получении информации о пользователе {user_id}: {response.status}")
-                        return None
+            return await self._request("GET", f"/users/{user_id}")
+        except MattermostAPIError as e:
+            logger.error("Ошибка при получении информации о пользователе %s: %s", user_id, e.status)
+            return None
         except Exception as e:
-            logger.error(f"Ошибка при запросе к Mattermost API: {e}")
+            logger.error("Ошибка при запросе к Mattermost API: %s", e)
             return None
 
 # Создаем экземпляр сервиса
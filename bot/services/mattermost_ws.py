@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from bot.config import settings
+from bot.services.http import get_http_session
+
+logger = logging.getLogger(__name__)
+
+class MattermostWebSocketListener:
+    """
+    Подписка на поток событий Mattermost через WebSocket.
+
+    Получает события posted вместе с полным постом, поэтому не нужен
+    отдельный REST-запрос get_post. При обрыве соединения переподключается
+    с экспоненциальной задержкой и передает connection_id и sequence_number,
+    чтобы сервер дослал пропущенные события.
+    """
+
+    def __init__(
+        self,
+        on_post: Callable[[Dict[str, Any]], Awaitable[None]],
+        url: Optional[str] = None,
+        token: Optional[str] = None,
+        channel_id: Optional[str] = None
+    ):
+        self.on_post = on_post
+        self.url = url or settings.MATTERMOST_WS_URL or self._default_url()
+        self.token = token or settings.MATTERMOST_TOKEN
+        self.channel_id = channel_id or settings.MATTERMOST_CHANNEL
+        self.connection_id: Optional[str] = None
+        self.sequence_number: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _default_url() -> str:
+        base_url = settings.MATTERMOST_URL
+        if "://" not in base_url:
+            base_url = f"https://{base_url}"
+        base_url = base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        return f"{base_url.rstrip('/')}/api/v4/websocket"
+
+    async def start(self) -> None:
+        """Запускает прослушивание в фоне"""
+        self._task = asyncio.create_task(self._run())
+        logger.info("Подписка на события Mattermost через WebSocket: %s", self.url)
+
+    async def stop(self) -> None:
+        """Останавливает прослушивание"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _connect_params(self) -> Dict[str, str]:
+        """Параметры для возобновления сессии после переподключения"""
+        if self.connection_id is None or self.sequence_number is None:
+            return {}
+        # Сервер ждет номер следующего события, а не последнего полученного
+        return {
+            "connection_id": self.connection_id,
+            "sequence_number": str(self.sequence_number + 1)
+        }
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                await self._listen()
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка WebSocket Mattermost: %s", e)
+            logger.info("Переподключение к WebSocket Mattermost через %s с", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.MATTERMOST_WS_RECONNECT_MAX_DELAY)
+
+    async def _listen(self) -> None:
+        session = await get_http_session(self.url)
+        async with session.ws_connect(
+            self.url,
+            params=self._connect_params(),
+            headers={"Authorization": f"Bearer {self.token}"},
+            heartbeat=30
+        ) as ws:
+            await ws.send_json({
+                "seq": 1,
+                "action": "authentication_challenge",
+                "data": {"token": self.token}
+            })
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    await self._handle_event(json.loads(msg.data))
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+
+    async def _handle_event(self, event: Dict[str, Any]) -> None:
+        # Ответы на наши запросы не содержат поля event
+        if "event" not in event:
+            return
+
+        if "seq" in event:
+            self.sequence_number = event["seq"]
+
+        if event["event"] == "hello":
+            connection_id = event.get("data", {}).get("connection_id")
+            if connection_id and connection_id != self.connection_id:
+                # Сервер не смог возобновить сессию, начинаем новую
+                self.connection_id = connection_id
+            return
+
+        if event["event"] != "posted":
+            return
+
+        channel_id = event.get("broadcast", {}).get("channel_id") or event.get("data", {}).get("channel_id")
+        if channel_id != self.channel_id:
+            return
+
+        post = json.loads(event["data"]["post"])
+        await self.on_post(post)
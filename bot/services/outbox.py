@@ -0,0 +1,442 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, exists, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from bot.bot import bot
+from bot.config import settings
+from bot.database import async_session
+from bot.models.models import OutboxJob, Ticket, User, Message as TicketMessage
+from bot.services.attachments import attachment_service, MATTERMOST_FILES_PER_POST
+from bot.services.mattermost import MattermostService
+from bot.services.plane import PlaneService
+from bot.services.ticket_routes import ticket_routes, TicketRoute
+from bot.services.ticket_pages import ticket_pages
+from bot.utils.metrics import ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Очереди доставки: задания одного тикета выполняются по порядку внутри своей очереди,
+# а очереди Plane и Mattermost обрабатываются параллельно
+LANE_MATTERMOST = "mattermost"
+LANE_PLANE = "plane"
+
+# Задание, создающее объект тикета во внешней системе, для каждой очереди
+CREATE_JOBS = {LANE_MATTERMOST: "create_thread", LANE_PLANE: "create_issue"}
+
+class PermanentJobError(Exception):
+    """Задание не может быть выполнено, повторять его бессмысленно"""
+
+def enqueue(
+    session: AsyncSession,
+    ticket_id: int,
+    lane: str,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None
+) -> OutboxJob:
+    """
+    Добавляет задание в outbox в рамках текущей транзакции
+
+    Задание станет видно воркерам только после commit вызывающего кода,
+    вместе с остальными изменениями этой транзакции.
+    """
+    job = OutboxJob(
+        ticket_id=ticket_id,
+        lane=lane,
+        kind=kind,
+        payload=payload or {},
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    session.add(job)
+    return job
+
+async def enqueue_message(
+    session: AsyncSession,
+    ticket_id: int,
+    lane: str,
+    kind: str,
+    message: TicketMessage
+) -> OutboxJob:
+    """
+    Добавляет сообщение тикета в outbox, склеивая его с предыдущими.
+
+    Если последнее задание очереди (ticket_id, lane) - еще не взятая воркером
+    пачка того же вида от того же отправителя, сообщение дописывается в нее,
+    а отправка откладывается еще на OUTBOX_COALESCE_WINDOW (но не дальше
+    OUTBOX_COALESCE_MAX_DELAY от первого сообщения). Иначе создается новое
+    задание. Сами сообщения по-прежнему хранятся по одному в messages.
+    """
+    now = datetime.utcnow()
+    window = timedelta(seconds=settings.OUTBOX_COALESCE_WINDOW)
+    length = len(message.content or "")
+
+    if window:
+        # Блокировка строки не дает воркеру захватить пачку, пока мы ее дополняем
+        last = await session.scalar(
+            select(OutboxJob)
+            .where(
+                OutboxJob.ticket_id == ticket_id,
+                OutboxJob.lane == lane,
+                OutboxJob.status == "pending"
+            )
+            .order_by(OutboxJob.id.desc())
+            .limit(1)
+            .with_for_update()
+        )
+        if (
+            last is not None
+            and last.kind == kind
+            and last.attempts == 0
+            and (last.locked_until is None or last.locked_until < now)
+            and last.payload.get("sender_type") == message.sender_type
+            and "message_ids" in last.payload
+            and len(last.payload["message_ids"]) < settings.OUTBOX_COALESCE_MAX_MESSAGES
+            and last.payload.get("chars", 0) + length <= settings.OUTBOX_COALESCE_MAX_CHARS
+        ):
+            # JSON-поле отслеживается только при присваивании нового значения
+            last.payload = {
+                **last.payload,
+                "message_ids": last.payload["message_ids"] + [message.id],
+                "chars": last.payload.get("chars", 0) + length
+            }
+            deadline = last.created_at + timedelta(seconds=settings.OUTBOX_COALESCE_MAX_DELAY)
+            last.next_attempt_at = min(now + window, max(deadline, last.next_attempt_at))
+            return last
+
+    job = enqueue(
+        session, ticket_id, lane, kind,
+        {"message_ids": [message.id], "sender_type": message.sender_type, "chars": length}
+    )
+    job.next_attempt_at = now + window
+    job.created_at = now
+    return job
+
+JobHandler = Callable[[AsyncSession, OutboxJob, Ticket], Awaitable[None]]
+
+class OutboxWorker:
+    """Пул фоновых воркеров, доставляющих задания из outbox во внешние системы"""
+
+    def __init__(self):
+        self.plane_service = PlaneService()
+        self.mattermost_service = MattermostService()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._handlers: Dict[str, JobHandler] = {
+            "create_thread": self._create_thread,
+            "create_issue": self._create_issue,
+            "mattermost_comment": self._mattermost_comment,
+            "plane_comment": self._plane_comment,
+            "mattermost_notice": self._mattermost_notice,
+            "delete_issue": self._delete_issue,
+        }
+
+    def notify(self) -> None:
+        """Будит воркеры после коммита новых заданий"""
+        self._wakeup.set()
+
+    async def start(self, workers: Optional[int] = None) -> None:
+        """Запускает воркеры"""
+        self._stopping = False
+        for n in range(workers or settings.OUTBOX_WORKERS):
+            self._tasks.append(asyncio.create_task(self._run(n)))
+        logger.info("Запущено воркеров outbox: %s", len(self._tasks))
+
+    async def stop(self) -> None:
+        """Останавливает воркеры, дожидаясь завершения текущих заданий"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, n: int) -> None:
+        while not self._stopping:
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                logger.error("Outbox worker %s: ошибка при получении задания: %s", n, e)
+                claimed = None
+
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            job_id, lease = claimed
+            try:
+                await self._process(job_id, lease)
+            except Exception as e:
+                # Транзакция откатывается при закрытии сессии; задание будет
+                # повторено после истечения аренды
+                ERRORS.labels("outbox").inc()
+                logger.error("Outbox worker %s: ошибка при обработке задания %s: %s", n, job_id, e)
+
+    async def _claim(self) -> Optional[Tuple[int, datetime]]:
+        """
+        Захватывает следующее готовое задание.
+
+        Задание доступно, только если в его очереди (ticket_id, lane) нет более
+        ранних невыполненных заданий. Захват оформляется арендой locked_until,
+        поэтому внешний вызов выполняется вне транзакции, а задание упавшего
+        воркера будет повторено после истечения аренды.
+
+        Returns:
+            id задания и срок аренды, по которому воркер потом проверяет,
+            что задание все еще за ним
+        """
+        now = datetime.utcnow()
+        earlier = aliased(OutboxJob)
+        async with async_session() as session:
+            job = await session.scalar(
+                select(OutboxJob)
+                .where(
+                    OutboxJob.status == "pending",
+                    OutboxJob.next_attempt_at <= now,
+                    or_(OutboxJob.locked_until.is_(None), OutboxJob.locked_until < now),
+                    ~exists().where(
+                        earlier.ticket_id == OutboxJob.ticket_id,
+                        earlier.lane == OutboxJob.lane,
+                        earlier.status == "pending",
+                        earlier.id < OutboxJob.id
+                    )
+                )
+                .order_by(OutboxJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job is None:
+                return None
+            lease = now + timedelta(seconds=settings.OUTBOX_LEASE_TIME)
+            job.locked_until = lease
+            await session.commit()
+            return job.id, lease
+
+    async def _process(self, job_id: int, lease: datetime) -> None:
+        async with async_session() as session:
+            job = await session.get(OutboxJob, job_id)
+            if job is None:
+                return
+            ticket = await session.get(Ticket, job.ticket_id)
+            kind = job.kind
+            try:
+                await self._handlers[kind](session, job, ticket)
+                error = None
+            except Exception as e:
+                error = e
+                if isinstance(e, SQLAlchemyError):
+                    # После ошибки БД транзакцию можно только откатить
+                    await session.rollback()
+                    await session.refresh(job)
+                    if ticket is not None:
+                        await session.refresh(ticket)
+
+            # Аренда могла истечь во время внешнего вызова, и задание уже взял
+            # другой воркер: результат этой попытки не записываем
+            held = await session.scalar(
+                select(OutboxJob.id)
+                .where(OutboxJob.id == job_id, OutboxJob.locked_until == lease)
+                .with_for_update()
+            )
+            if held is None:
+                await session.rollback()
+                logger.warning("Задание outbox %s (%s): аренда истекла, результат попытки отброшен", job_id, kind)
+                return
+
+            canceled = False
+            if error is not None:
+                ERRORS.labels(f"outbox_{job.lane}").inc()
+                job.attempts += 1
+                job.last_error = str(error)
+                job.locked_until = None
+                if job.attempts >= settings.OUTBOX_MAX_ATTEMPTS or isinstance(error, PermanentJobError):
+                    job.status = "failed"
+                    logger.error("Задание outbox %s (%s, тикет %s) не выполнено: %s", job.id, job.kind, job.ticket_id, error)
+                    if job.kind in CREATE_JOBS.values():
+                        canceled = await self._create_failed(session, job, ticket)
+                else:
+                    delay = min(
+                        settings.OUTBOX_RETRY_BASE_DELAY * (2 ** (job.attempts - 1)),
+                        settings.OUTBOX_RETRY_MAX_DELAY
+                    )
+                    job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    logger.warning(
+                        "Задание outbox %s (%s, тикет %s): попытка %s не удалась (%s), повтор через %s с",
+                        job.id, job.kind, job.ticket_id, job.attempts, error, delay
+                    )
+            else:
+                job.status = "done"
+                job.locked_until = None
+            await session.commit()
+            if canceled:
+                await self._notify_canceled(session, ticket)
+
+    async def _create_failed(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> bool:
+        """
+        Компенсация после окончательной ошибки создания объекта тикета.
+
+        Оставшиеся задания этой очереди без созданного объекта невыполнимы
+        и сразу помечаются неудавшимися. Если не создана задача Plane, тикет
+        продолжает работать в Mattermost, а поддержка получает предупреждение
+        в треде. Если не создан тред Mattermost, поддержка тикет не увидит:
+        он отменяется, а уже созданная задача Plane удаляется.
+
+        Returns:
+            True, если тикет отменен и пользователя нужно предупредить
+        """
+        await session.execute(
+            update(OutboxJob)
+            .where(
+                OutboxJob.ticket_id == job.ticket_id,
+                OutboxJob.lane == job.lane,
+                OutboxJob.status == "pending",
+                OutboxJob.id != job.id
+            )
+            .values(status="failed", last_error=f"{job.kind} failed", locked_until=None)
+        )
+        if job.kind == "create_issue":
+            enqueue(session, ticket.id, LANE_MATTERMOST, "mattermost_notice", {
+                "message": "⚠️ Задача в Plane для этой заявки не создана, сообщения в Plane не передаются."
+            })
+            return False
+
+        if ticket.status != "active":
+            return False
+        ticket.status = "canceled"
+        # Выполнится после create_issue, если та еще в очереди
+        enqueue(session, ticket.id, LANE_PLANE, "delete_issue")
+        return True
+
+    async def _notify_canceled(self, session: AsyncSession, ticket: Ticket) -> None:
+        """Сообщает пользователю, что заявку не удалось зарегистрировать"""
+        self.notify()
+        await ticket_pages.invalidate(ticket.user_id)
+        user = await session.get(User, ticket.user_id)
+        if not user:
+            return
+        try:
+            await bot.send_message(
+                chat_id=user.telegram_id,
+                text=f"Не удалось зарегистрировать заявку «{ticket.title}» в системе поддержки. "
+                     "Пожалуйста, создайте ее заново."
+            )
+        except Exception as e:
+            logger.error("Не удалось уведомить пользователя об отмене тикета %s: %s", ticket.id, e)
+
+    async def _require(self, session: AsyncSession, ticket: Ticket, lane: str) -> None:
+        """
+        Ошибка, если объект тикета в очереди lane еще не создан.
+
+        Если его создание окончательно не удалось, задание невыполнимо
+        и не повторяется.
+        """
+        create_failed = await session.scalar(
+            select(exists().where(
+                OutboxJob.ticket_id == ticket.id,
+                OutboxJob.kind == CREATE_JOBS[lane],
+                OutboxJob.status == "failed"
+            ))
+        )
+        if create_failed:
+            raise PermanentJobError(f"{CREATE_JOBS[lane]} failed for ticket {ticket.id}")
+        if lane == LANE_MATTERMOST:
+            raise ValueError(f"Ticket {ticket.id} has no Mattermost thread yet")
+        raise ValueError(f"Ticket {ticket.id} has no Plane issue yet")
+
+    async def _create_thread(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        if ticket.mattermost_post_id:
+            return
+        ticket.mattermost_post_id = await self.mattermost_service.create_thread(
+            title=job.payload["title"],
+            message=ticket.description
+        )
+        # Ответы в новом треде будут маршрутизироваться без запросов к БД
+        user = await session.get(User, ticket.user_id)
+        await ticket_routes.set(
+            ticket.mattermost_post_id,
+            TicketRoute(id=ticket.id, telegram_id=user.telegram_id, title=ticket.title, status=ticket.status)
+        )
+
+    async def _create_issue(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        if ticket.plane_ticket_id:
+            return
+        ticket.plane_ticket_id = await self.plane_service.create_ticket(
+            title=job.payload["title"],
+            description=ticket.description
+        )
+
+    async def _messages(self, session: AsyncSession, job: OutboxJob) -> List[TicketMessage]:
+        """Сообщения задания в порядке отправки"""
+        # Задания, созданные до появления склейки, содержат одно сообщение
+        message_ids = job.payload.get("message_ids") or [job.payload["message_id"]]
+        return list(await session.scalars(
+            select(TicketMessage)
+            .where(TicketMessage.id.in_(message_ids))
+            .order_by(TicketMessage.id)
+        ))
+
+    async def _mattermost_comment(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        """
+        Публикует пачку сообщений в треде тикета.
+
+        Текст и файлы, разбитые по постам, вычисляются один раз и сохраняются
+        в задании вместе с числом уже опубликованных постов: повтор после
+        ошибки продолжает с первого неопубликованного поста, не дублируя текст
+        и уже прикрепленные файлы.
+        """
+        if not ticket.mattermost_post_id:
+            await self._require(session, ticket, LANE_MATTERMOST)
+        if "file_batches" not in job.payload:
+            messages = await self._messages(session, job)
+            attachments = await attachment_service.for_messages(session, [m.id for m in messages])
+            file_ids, notes = await attachment_service.upload_to_mattermost(session, attachments)
+            # Файлы сверх лимита одного поста уходят следующими ответами в тред
+            batches = [file_ids[i:i + MATTERMOST_FILES_PER_POST] for i in range(0, len(file_ids), MATTERMOST_FILES_PER_POST)] or [[]]
+            job.payload = {
+                **job.payload,
+                "text": "\n".join([m.content for m in messages] + notes),
+                "file_batches": batches,
+                "posted": 0
+            }
+
+        batches = job.payload["file_batches"]
+        for n in range(job.payload.get("posted", 0), len(batches)):
+            text = job.payload["text"] if n == 0 else ""
+            await self.mattermost_service.add_comment(ticket.mattermost_post_id, text, is_bot=True, file_ids=batches[n])
+            job.payload = {**job.payload, "posted": n + 1}
+
+    async def _mattermost_notice(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        if not ticket.mattermost_post_id:
+            await self._require(session, ticket, LANE_MATTERMOST)
+        await self.mattermost_service.add_comment(ticket.mattermost_post_id, job.payload["message"], is_bot=True)
+
+    async def _plane_comment(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        if not ticket.plane_ticket_id:
+            await self._require(session, ticket, LANE_PLANE)
+        messages = await self._messages(session, job)
+        attachments = await attachment_service.for_messages(session, [m.id for m in messages])
+        await attachment_service.upload_to_plane(session, ticket.plane_ticket_id, attachments)
+        await self.plane_service.update_ticket(
+            ticket.plane_ticket_id,
+            "\n".join(m.content for m in messages),
+            is_from_support=messages[0].sender_type == "support"
+        )
+
+    async def _delete_issue(self, session: AsyncSession, job: OutboxJob, ticket: Ticket) -> None:
+        """Компенсация: удаляет задачу Plane отмененного тикета"""
+        if ticket.plane_ticket_id:
+            await self.plane_service.delete_ticket(ticket.plane_ticket_id)
+            ticket.plane_ticket_id = None
+
+# Общий пул воркеров
+outbox_worker = OutboxWorker()
@@ -1,5 +1,11 @@
-import aiohttp
 from bot.config import settings
+from typing import Any, Optional
+import aiohttp
+import logging
+from bot.services.http import get_http_session
+from bot.utils.metrics import observe_call
+
+logger = logging.getLogger(__name__)
 
 class PlaneService:
     def __init__(self):
@@ -11,45 +17,100 @@ class PlaneService:
         self.workspace_id = settings.PLANE_WORKSPACE_ID
         self.project_id = settings.PLANE_PROJECT_ID
 
+    @observe_call("plane", "create_ticket")
     async def create_ticket(self, title: str, description: str) -> str:
         """Создает новый тикет в Plane.so"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/"
-            data = {
-                "name": title,
-                "description_html": description
-            }
-            print(f"Sending request to URL: {url}")
-            print(f"Request data: {data}")
-            print(f"Request headers: {self.headers}")
-            async with session.post(url, json=data, headers=self.headers) as response:
-                result = await response.json()
-                print(f"Plane API response: {result}")  # Добавляем логирование
-                if not response.ok:
-                    raise Exception(f"Failed to create ticket: {result}")
-                return result.get("id") or result.get("pk")
+        session = await get_http_session(self.base_url)
+        url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/"
+        data = {
+            "name": title,
+            "description_html": description
+        }
+        logger.debug("Создание тикета в Plane: %s", url)
+        async with session.post(url, json=data, headers=self.headers) as response:
+            result = await response.json()
+            logger.debug("Ответ Plane API: %s", result)
+            if not response.ok:
+                raise Exception(f"Failed to create ticket: {result}")
+            return result.get("id") or result.get("pk")
 
+    @observe_call("plane", "update_ticket")
     async def update_ticket(self, ticket_id: str, comment: str, is_from_support: bool = False):
         """Добавляет комментарий к существующему тикету"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/{ticket_id}/comments/"
-            
-            # Формируем префикс в зависимости от отправителя
-            prefix = "Сообщение от поддержки:" if is_from_support else "Сообщение от клиента:"
-            
-            data = {
-                "comment_html": f"<p>{prefix}\n\n{comment}</p>"
-            }
-            async with session.post(url, json=data, headers=self.headers) as response:
-                await response.json()
+        session = await get_http_session(self.base_url)
+        url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/{ticket_id}/comments/"
+
+        # Формируем префикс в зависимости от отправителя
+        prefix = "Сообщение от поддержки:" if is_from_support else "Сообщение от клиента:"
+
+        data = {
+            "comment_html": f"<p>{prefix}\n\n{comment}</p>"
+        }
+        async with session.post(url, json=data, headers=self.headers) as response:
+            if not response.ok:
+                raise Exception(f"Failed to add comment to ticket {ticket_id}: {response.status} {await response.text()}")
 
+    @observe_call("plane", "upload_attachment")
+    async def upload_attachment(
+        self,
+        ticket_id: str,
+        filename: str,
+        content: Any,
+        content_type: Optional[str] = None,
+        size: Optional[int] = None
+    ) -> str:
+        """
+        Прикрепляет файл к тикету и возвращает id вложения.
+
+        Plane выдает presigned-форму хранилища: файл отправляется прямо туда
+        (content может быть асинхронным итератором чанков), после чего
+        вложение отмечается загруженным.
+        """
+        session = await get_http_session(self.base_url)
+        url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/{ticket_id}/issue-attachments/"
+        data = {
+            "name": filename,
+            "type": content_type or "application/octet-stream",
+            "size": size or 0
+        }
+        async with session.post(url, json=data, headers=self.headers) as response:
+            result = await response.json()
+            if not response.ok:
+                raise Exception(f"Failed to create attachment: {result}")
+        asset_id = result["asset_id"]
+        upload = result["upload_data"]
+
+        form = aiohttp.FormData()
+        for key, value in upload.get("fields", {}).items():
+            form.add_field(key, value)
+        form.add_field("file", content, filename=filename, content_type=data["type"])
+        storage = await get_http_session(upload["url"])
+        async with storage.post(upload["url"], data=form) as response:
+            if not response.ok:
+                raise Exception(f"Failed to upload attachment {filename}: {response.status}")
+
+        async with session.patch(f"{url}{asset_id}/", json={"is_uploaded": True}, headers=self.headers) as response:
+            if not response.ok:
+                raise Exception(f"Failed to confirm attachment {asset_id}: {response.status}")
+        return asset_id
+
+    @observe_call("plane", "delete_ticket")
+    async def delete_ticket(self, ticket_id: str) -> None:
+        """Удаляет тикет в Plane.so (используется для компенсации)"""
+        session = await get_http_session(self.base_url)
+        url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues/{ticket_id}/"
+        async with session.delete(url, headers=self.headers) as response:
+            if not response.ok:
+                raise Exception(f"Failed to delete ticket {ticket_id}: {response.status}")
+
+    @observe_call("plane", "get_user_tickets")
     async def get_user_tickets(self, user_id: int) -> list:
         """Получает список тикетов пользователя"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues"
-            params = {
-                "subscriber_id": user_id,
-                "state": ["backlog", "in_progress"]  # или другие статусы
-            }
-            async with session.get(url, params=params, headers=self.headers) as response:
-                return await response.json()
+        session = await get_http_session(self.base_url)
+        url = f"{self.base_url}/api/v1/workspaces/{self.workspace_id}/projects/{self.project_id}/issues"
+        params = {
+            "subscriber_id": user_id,
+            "state": ["backlog", "in_progress"]  # или другие статусы
+        }
+        async with session.get(url, params=params, headers=self.headers) as response:
+            return await response.json()
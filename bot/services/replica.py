@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import settings
+from bot.database import async_session, readonly_engine, replica_engine, redis
+
+logger = logging.getLogger(__name__)
+
+# Состояние реплики: режим восстановления, прием WAL от основной БД и
+# отставание в секундах. Если все полученное WAL уже применено, реплика
+# догнала основную БД: время последней транзакции при простое основной БД
+# растет, но отставанием не является. Это верно, только пока WAL
+# принимается потоком (status = 'streaming'): реплика, потерявшая связь
+# с основной БД, тоже применила все, что получила, но сколь угодно устарела
+LAG_SQL = """
+SELECT
+    pg_is_in_recovery(),
+    (SELECT pid FROM pg_stat_wal_receiver),
+    (SELECT status FROM pg_stat_wal_receiver),
+    CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+class ReplicaRouter:
+    """
+    Выбор базы для чтений: реплика или основная БД.
+
+    Чтения идут в реплику, пока ее отставание не больше DB_REPLICA_MAX_LAG
+    (проверяется в фоне раз в DB_REPLICA_LAG_CHECK_INTERVAL). Пользователь,
+    по которому недавно была запись, в течение DB_READ_YOUR_WRITES_TTL читает
+    из основной БД, чтобы сразу видеть свои изменения. Отметка о записи
+    хранится в Redis и видна всем репликам приложения.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.lag: Optional[float] = None
+        self.available = False
+        self.reason: Optional[str] = None
+        self.reads_replica = 0
+        self.reads_primary_lag = 0
+        self.reads_primary_recent_write = 0
+
+    @property
+    def enabled(self) -> bool:
+        return replica_engine is not None
+
+    @staticmethod
+    def _key(telegram_id: int) -> str:
+        return f"db:wrote:{telegram_id}"
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        await self._check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_REPLICA_LAG_CHECK_INTERVAL)
+            await self._check()
+
+    async def _check(self) -> None:
+        try:
+            async with replica_engine.connect() as conn:
+                in_recovery, receiver_pid, receiver_status, lag = (await conn.execute(text(LAG_SQL))).one()
+        except Exception as e:
+            self._set_unavailable(f"реплика недоступна: {e}")
+            return
+
+        if not in_recovery:
+            # Сервер не в режиме восстановления, то есть это не реплика
+            lag = 0
+        elif receiver_status != "streaming":
+            if receiver_pid is not None and receiver_status is None:
+                # Без роли pg_read_all_stats статус приемника WAL не виден
+                self._set_unavailable("пользователю БД нужна роль pg_read_all_stats для проверки репликации")
+            else:
+                self._set_unavailable(f"реплика не принимает WAL от основной БД ({receiver_status or 'нет приемника'})")
+            return
+
+        self.lag = float(lag or 0)
+        available = self.lag <= settings.DB_REPLICA_MAX_LAG
+        if available != self.available:
+            if available:
+                logger.info("Чтения переключены на реплику (отставание %.1f с)", self.lag)
+            else:
+                logger.warning("Отставание реплики %.1f с, чтения идут в основную БД", self.lag)
+        self.available = available
+        self.reason = None if available else "отставание больше DB_REPLICA_MAX_LAG"
+
+    def _set_unavailable(self, reason: str) -> None:
+        if self.available or self.reason != reason:
+            logger.warning("Чтения идут в основную БД: %s", reason)
+        self.reason = reason
+        self.lag = None
+        self.available = False
+
+    async def mark_write(self, telegram_id: Optional[int]) -> None:
+        """Отмечает запись по пользователю: его чтения какое-то время идут в основную БД"""
+        if not self.enabled or telegram_id is None:
+            return
+        try:
+            await redis.set(self._key(telegram_id), "1", ex=settings.DB_READ_YOUR_WRITES_TTL)
+        except Exception as e:
+            logger.warning("Не удалось отметить запись пользователя %s: %s", telegram_id, e)
+
+    async def use_replica(self, telegram_id: Optional[int] = None) -> bool:
+        """Можно ли читать данные пользователя из реплики"""
+        if not self.enabled:
+            return False
+        if not self.available:
+            self.reads_primary_lag += 1
+            return False
+        if telegram_id is not None:
+            try:
+                wrote = await redis.exists(self._key(telegram_id))
+            except Exception as e:
+                # Без Redis нельзя проверить недавнюю запись - читаем из основной БД
+                logger.warning("Redis недоступен для маршрутизации чтений: %s", e)
+                wrote = True
+            if wrote:
+                self.reads_primary_recent_write += 1
+                return False
+        self.reads_replica += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние реплики и распределение чтений"""
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "lag_seconds": self.lag,
+            "unavailable_reason": None if self.available else self.reason,
+            "reads_replica": self.reads_replica,
+            "reads_primary_lag": self.reads_primary_lag,
+            "reads_primary_recent_write": self.reads_primary_recent_write,
+        }
+
+# Общий маршрутизатор чтений
+replica_router = ReplicaRouter()
+
+async def get_readonly_session() -> AsyncIterator[AsyncSession]:
+    """Сессия для административных отчетов: реплика, если она не отстает"""
+    bind = replica_engine if await replica_router.use_replica() else readonly_engine
+    async with async_session(bind=bind) as session:
+        yield session
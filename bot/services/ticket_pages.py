@@ -0,0 +1,49 @@
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from bot.config import settings
+from bot.database import redis
+
+logger = logging.getLogger(__name__)
+
+class TicketPageCache:
+    """
+    Кэш страниц списка заявок пользователя.
+
+    Страницы пользователя лежат в одном hash Redis (поле - курсор), поэтому
+    при создании, подтверждении, закрытии или отмене заявки все они
+    сбрасываются одной командой.
+    """
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"tickets:pages:{user_id}"
+
+    async def get(self, user_id: int, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await redis.hget(self._key(user_id), cursor or "")
+        except Exception as e:
+            logger.warning("Redis недоступен для кэша списков заявок: %s", e)
+            return None
+        return json.loads(raw) if raw else None
+
+    async def set(self, user_id: int, cursor: Optional[str], page: Dict[str, Any]) -> None:
+        key = self._key(user_id)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, cursor or "", json.dumps(page, ensure_ascii=False))
+                pipe.expire(key, settings.TICKET_PAGE_CACHE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Не удалось сохранить список заявок %s в Redis: %s", user_id, e)
+
+    async def invalidate(self, user_id: int) -> None:
+        """Сбрасывает все страницы пользователя"""
+        try:
+            await redis.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning("Не удалось сбросить списки заявок %s: %s", user_id, e)
+
+# Общий экземпляр кэша
+ticket_pages = TicketPageCache()
@@ -0,0 +1,111 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, replace
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from bot.config import settings
+from bot.database import redis
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class TicketRoute:
+    """Все, что нужно для доставки ответа поддержки пользователю (id - id тикета)"""
+    id: int
+    telegram_id: int
+    title: str
+    status: str
+
+class TicketRouteCache:
+    """
+    Маршруты ответов поддержки: id корневого поста Mattermost -> тикет и чат Telegram.
+
+    Первый уровень - LRU в памяти процесса с коротким TTL, второй - Redis.
+    Маршрут записывается при создании треда тикета, при промахе загружается
+    одним запросом с join. Смена статуса тикета обновляет запись в Redis;
+    другие реплики увидят ее после истечения локального TTL.
+    """
+
+    def __init__(self):
+        self._local: "OrderedDict[str, Tuple[float, Optional[TicketRoute]]]" = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(post_id: str) -> str:
+        return f"ticket:route:{post_id}"
+
+    def _set_local(self, post_id: str, route: Optional[TicketRoute]) -> None:
+        self._local[post_id] = (time.monotonic() + settings.TICKET_ROUTE_LOCAL_TTL, route)
+        self._local.move_to_end(post_id)
+        if len(self._local) > settings.TICKET_ROUTE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    async def get(
+        self,
+        post_id: str,
+        loader: Callable[[str], Awaitable[Optional[TicketRoute]]]
+    ) -> Optional[TicketRoute]:
+        """Возвращает маршрут из кэша, при промахе загружает его через loader"""
+        cached = self._local.get(post_id)
+        if cached and cached[0] > time.monotonic():
+            self._local.move_to_end(post_id)
+            self.local_hits += 1
+            return cached[1]
+
+        try:
+            raw = await redis.get(self._key(post_id))
+        except Exception as e:
+            logger.warning("Redis недоступен для маршрутов тикетов: %s", e)
+            raw = None
+
+        if raw is not None:
+            self.redis_hits += 1
+            data = json.loads(raw)
+            route = TicketRoute(**data) if data else None
+            self._set_local(post_id, route)
+            return route
+
+        self.misses += 1
+        route = await loader(post_id)
+        await self.set(post_id, route)
+        return route
+
+    async def set(self, post_id: str, route: Optional[TicketRoute]) -> None:
+        """Сохраняет маршрут (или факт, что пост не является тредом тикета)"""
+        self._set_local(post_id, route)
+        ttl = settings.TICKET_ROUTE_TTL if route else settings.TICKET_ROUTE_NEGATIVE_TTL
+        try:
+            await redis.set(self._key(post_id), json.dumps(asdict(route) if route else None), ex=ttl)
+        except Exception as e:
+            logger.warning("Не удалось сохранить маршрут %s в Redis: %s", post_id, e)
+
+    async def set_status(self, post_id: Optional[str], status: str) -> None:
+        """Обновляет статус тикета в маршруте (закрытие, отмена)"""
+        if not post_id:
+            return
+        self._local.pop(post_id, None)
+        try:
+            raw = await redis.get(self._key(post_id))
+            data = json.loads(raw) if raw else None
+            # Если маршрута в Redis нет, следующий промах прочитает статус из БД
+            if data:
+                await self.set(post_id, replace(TicketRoute(**data), status=status))
+        except Exception as e:
+            # Без Redis удаляем хотя бы локальную копию; следующий промах перечитает БД
+            logger.warning("Не удалось обновить маршрут %s в Redis: %s", post_id, e)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов"""
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_size": len(self._local),
+        }
+
+# Общий экземпляр кэша
+ticket_routes = TicketRouteCache()
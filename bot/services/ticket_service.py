@@ -1,10 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from bot.models.models import User, Ticket, Message as TicketMessage
+from sqlalchemy import select, update, tuple_, func, literal_column, union_all
+from bot.models.models import User, Ticket, Message as TicketMessage, Attachment, SEARCH_CONFIG
 from bot.services.plane import PlaneService
 from bot.services.mattermost import MattermostService
-from typing import Optional, List, Dict
-from datetime import datetime
+from bot.services.outbox import enqueue, enqueue_message, outbox_worker, LANE_MATTERMOST, LANE_PLANE
+from bot.services.user_cache import user_cache, UserProfile
+from bot.services.timers import timer_wheel, AUTOCLOSE, SLA
+from bot.services.ticket_routes import ticket_routes, TicketRoute
+from bot.services.ticket_pages import ticket_pages
+from bot.config import settings
+from bot.utils.metrics import TICKETS_CREATED, MESSAGES_RELAYED
+from typing import Any, Optional, List, Dict, Tuple, Union
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 class TicketService:
     def __init__(self):
@@ -17,6 +27,14 @@ class TicketService:
             select(User).where(User.telegram_id == telegram_id)
         )
 
+    async def get_user_profile(self, session: AsyncSession, telegram_id: int) -> Optional[UserProfile]:
+        """Получает профиль пользователя по telegram_id через кэш"""
+        async def load(telegram_id: int) -> Optional[UserProfile]:
+            user = await self.get_user_by_telegram_id(session, telegram_id)
+            return UserProfile.from_user(user) if user else None
+
+        return await user_cache.get(telegram_id, load)
+
     async def get_user_by_id(self, session: AsyncSession, user_id: int) -> Optional[User]:
         """Получает пользователя по ID"""
         return await session.scalar(
@@ -29,6 +47,18 @@ class TicketService:
             select(Ticket).where(Ticket.mattermost_post_id == mattermost_post_id)
         )
 
+    async def get_ticket_route(self, session: AsyncSession, mattermost_post_id: str) -> Optional[TicketRoute]:
+        """Маршрут ответа поддержки по id корневого поста треда (через кэш)"""
+        async def load(post_id: str) -> Optional[TicketRoute]:
+            row = (await session.execute(
+                select(Ticket.id, User.telegram_id, Ticket.title, Ticket.status)
+                .join(User, User.id == Ticket.user_id)
+                .where(Ticket.mattermost_post_id == post_id)
+            )).first()
+            return TicketRoute(*row) if row else None
+
+        return await ticket_routes.get(mattermost_post_id, load)
+
     async def get_active_tickets(self, session: AsyncSession, user_id: int) -> List[Ticket]:
         """Получает активные тикеты пользователя"""
         return list(await session.scalars(
@@ -40,6 +70,163 @@ class TicketService:
             .order_by(Ticket.created_at.desc())
         ))
 
+    @staticmethod
+    def encode_cursor(direction: str, created_at: datetime, ticket_id: int) -> str:
+        """Курсор страницы: направление, created_at в микросекундах и id строки (помещается в callback_data)"""
+        micros = (created_at - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+        return f"{direction}{micros}.{ticket_id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, datetime, int]:
+        """Разбирает курсор; ValueError, если курсор поврежден (например, подделан в callback_data)"""
+        try:
+            micros, ticket_id = cursor[1:].split(".")
+            if cursor[0] not in ("n", "p") or int(micros) < 0:
+                raise ValueError
+            return cursor[0], datetime(1970, 1, 1) + timedelta(microseconds=int(micros)), int(ticket_id)
+        except (IndexError, ValueError, OverflowError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    async def get_tickets_page(self, session: AsyncSession, user_id: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Страница незакрытых тикетов пользователя для клавиатуры выбора.
+
+        Keyset-пагинация по (created_at, id) от новых к старым: выбираются
+        только нужные для кнопок колонки, без OFFSET. Готовые страницы
+        кэшируются на TICKET_PAGE_CACHE_TTL.
+
+        Args:
+            cursor: "n..." - следующая страница после тикета, "p..." - предыдущая
+                перед тикетом, None - первая страница
+
+        Returns:
+            dict: tickets (как format_tickets_for_keyboard), prev и next - курсоры или None
+        """
+        cached = await ticket_pages.get(user_id, cursor)
+        if cached is not None:
+            return cached
+
+        page_size = settings.TICKET_PAGE_SIZE
+        query = select(Ticket.id, Ticket.title, Ticket.status, Ticket.created_at).where(
+            Ticket.user_id == user_id,
+            Ticket.status != 'closed'
+        )
+        direction = None
+        if cursor:
+            direction, created_at, ticket_id = self.decode_cursor(cursor)
+        if direction == "p":
+            query = query.where(tuple_(Ticket.created_at, Ticket.id) > (created_at, ticket_id)).order_by(Ticket.created_at, Ticket.id)
+        else:
+            if direction == "n":
+                query = query.where(tuple_(Ticket.created_at, Ticket.id) < (created_at, ticket_id))
+            query = query.order_by(Ticket.created_at.desc(), Ticket.id.desc())
+
+        rows = list(await session.execute(query.limit(page_size + 1)))
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == "p":
+            rows.reverse()
+        if not rows and cursor:
+            # Тикеты соседней страницы успели закрыть - показываем первую
+            return await self.get_tickets_page(session, user_id)
+
+        has_next = more if direction != "p" else True
+        has_prev = direction == "n" or (direction == "p" and more)
+        page = {
+            "tickets": self.format_tickets_for_keyboard(rows),
+            "prev": self.encode_cursor("p", rows[0].created_at, rows[0].id) if has_prev and rows else None,
+            "next": self.encode_cursor("n", rows[-1].created_at, rows[-1].id) if has_next and rows else None,
+        }
+        await ticket_pages.set(user_id, cursor, page)
+        return page
+
+    async def get_messages_page(
+        self,
+        session: AsyncSession,
+        ticket_id: int,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Страница истории тикета от старых сообщений к новым.
+
+        Keyset-пагинация по (ticket_id, created_at, id): каждая страница -
+        один проход по индексу от курсора, без OFFSET.
+
+        Returns:
+            строки (id, sender_type, content, created_at) и курсор следующей страницы
+        """
+        limit = limit or settings.HISTORY_PAGE_SIZE
+        query = select(
+            TicketMessage.id, TicketMessage.sender_type, TicketMessage.content, TicketMessage.created_at
+        ).where(TicketMessage.ticket_id == ticket_id)
+        if cursor:
+            _, created_at, message_id = self.decode_cursor(cursor)
+            query = query.where(tuple_(TicketMessage.created_at, TicketMessage.id) > (created_at, message_id))
+        rows = list(await session.execute(
+            query.order_by(TicketMessage.created_at, TicketMessage.id).limit(limit + 1)
+        ))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, self.encode_cursor("n", rows[-1].created_at, rows[-1].id)
+        return rows, None
+
+    async def search_tickets(
+        self,
+        session: AsyncSession,
+        query: str,
+        company: Optional[str] = None,
+        shop: Optional[str] = None,
+        user_id: Optional[int] = None,
+        limit: int = 20
+    ) -> List[Any]:
+        """
+        Полнотекстовый поиск тикетов по заголовку, описанию и сообщениям.
+
+        Совпадения ищутся по GIN-индексам search_vector (русская морфология,
+        синтаксис запроса как в поисковиках: "фразы", -исключения, or).
+        Тикет ранжируется по лучшему совпадению; заголовок весит больше
+        описания, совпадение в сообщении - вдвое меньше, чем в самом тикете.
+
+        Returns:
+            строки (id, title, status, created_at, full_name, company, shop, rank)
+        """
+        config = literal_column(f"'{SEARCH_CONFIG}'")
+        ts_query = func.websearch_to_tsquery(config, query)
+        hits = union_all(
+            select(
+                Ticket.id.label("ticket_id"),
+                func.ts_rank(Ticket.search_vector, ts_query).label("rank")
+            ).where(Ticket.search_vector.op("@@")(ts_query)),
+            select(
+                TicketMessage.ticket_id.label("ticket_id"),
+                (func.ts_rank(TicketMessage.search_vector, ts_query) * 0.5).label("rank")
+            ).where(TicketMessage.search_vector.op("@@")(ts_query))
+        ).subquery()
+        ranked = (
+            select(hits.c.ticket_id, func.max(hits.c.rank).label("rank"))
+            .group_by(hits.c.ticket_id)
+            .subquery()
+        )
+
+        statement = (
+            select(
+                Ticket.id, Ticket.title, Ticket.status, Ticket.created_at,
+                User.full_name, User.company, User.shop, ranked.c.rank
+            )
+            .join(ranked, ranked.c.ticket_id == Ticket.id)
+            .join(User, User.id == Ticket.user_id)
+        )
+        if company:
+            statement = statement.where(User.company == company)
+        if shop:
+            statement = statement.where(User.shop == shop)
+        if user_id:
+            statement = statement.where(Ticket.user_id == user_id)
+        return list(await session.execute(
+            statement.order_by(ranked.c.rank.desc(), Ticket.id.desc()).limit(limit)
+        ))
+
     async def get_ticket_by_id(self, session: AsyncSession, ticket_id: int) -> Optional[Ticket]:
         """Получает тикет по ID"""
         result = await session.execute(
@@ -77,31 +264,55 @@ class TicketService:
         await session.commit()
         return new_ticket
 
-    async def add_message_to_ticket(self, session: AsyncSession, ticket: Ticket, message_text: str, sender_type: str = "user") -> None:
-        """Добавляет сообщение к тикету"""
-        # Определяем, является ли сообщение от поддержки
-        is_from_support = sender_type == "support"
-        
-        # Отправляем сообщение в Plane только если это сообщение от пользователя
-        if not is_from_support:
-            await self.plane_service.update_ticket(ticket.plane_ticket_id, message_text, is_from_support=False)
-        
-        # Отправляем сообщение в Mattermost только если это сообщение от пользователя
-        if not is_from_support:
-            await self.mattermost_service.add_comment(
-                ticket.mattermost_post_id, 
-                message_text,
-                is_bot=True
-            )
-        
-        # Сохраняем сообщение в базе данных
+    async def add_message_to_ticket(
+        self,
+        session: AsyncSession,
+        ticket: Union[Ticket, TicketRoute],
+        message_text: str,
+        sender_type: str = "user",
+        attachments: Optional[List[Dict[str, Any]]] = None
+    ) -> TicketMessage:
+        """
+        Добавляет сообщение к тикету.
+
+        Сообщение и задания на доставку в Plane/Mattermost сохраняются в одной
+        транзакции; саму доставку выполняют воркеры outbox, склеивая
+        серию быстрых сообщений в один комментарий. Вложения сохраняются
+        вместе с сообщением, файлы пересылают те же воркеры.
+        """
         new_message = TicketMessage(
             ticket_id=ticket.id,
             content=message_text,
             sender_type=sender_type
         )
         session.add(new_message)
+        await session.flush()
+        for attachment in attachments or []:
+            session.add(Attachment(message_id=new_message.id, ticket_id=ticket.id, **attachment))
+        
+        # Сообщение поддержки уже есть в Mattermost, его нужно отправить только в Plane.
+        # Подряд идущие сообщения склеиваются в один комментарий
+        if sender_type != "support":
+            await enqueue_message(session, ticket.id, LANE_MATTERMOST, "mattermost_comment", new_message)
+        await enqueue_message(session, ticket.id, LANE_PLANE, "plane_comment", new_message)
+        
         await session.commit()
+        outbox_worker.notify()
+        await self._schedule_autoclose(ticket)
+        if sender_type == "support":
+            # Первый ответ поддержки получен
+            await timer_wheel.cancel(ticket.id, SLA)
+        else:
+            MESSAGES_RELAYED.labels("to_support").inc()
+        return new_message
+
+    async def _schedule_autoclose(self, ticket: Ticket) -> None:
+        """Переносит автозакрытие тикета на TICKET_ACTIVE_TIME от текущего момента"""
+        if settings.TICKET_ACTIVE_TIME:
+            await timer_wheel.schedule(
+                AUTOCLOSE, ticket.id,
+                datetime.utcnow() + timedelta(seconds=settings.TICKET_ACTIVE_TIME)
+            )
 
     def format_tickets_for_keyboard(self, tickets: List[Ticket]) -> List[Dict]:
         """Форматирует тикеты для отображения в клавиатуре"""
@@ -119,8 +330,11 @@ class TicketService:
         ticket.status = 'closed'
         ticket.closed_at = datetime.utcnow()
         await session.commit()
+        await ticket_pages.invalidate(ticket.user_id)
+        await timer_wheel.cancel(ticket.id)
+        await ticket_routes.set_status(ticket.mattermost_post_id, ticket.status)
 
-    async def create_pending_ticket(self, session: AsyncSession, user: User, title: str, description: str) -> Ticket:
+    async def create_pending_ticket(self, session: AsyncSession, user: Union[User, UserProfile], title: str, description: str) -> Ticket:
         """Создает тикет в статусе pending"""
         ticket = Ticket(
             user_id=user.id,
@@ -131,10 +345,42 @@ class TicketService:
         session.add(ticket)
         await session.commit()
         await session.refresh(ticket)
+        await ticket_pages.invalidate(user.id)
         return ticket
 
-    async def activate_ticket(self, session: AsyncSession, ticket: Ticket) -> None:
-        """Активирует тикет, отправляя его в Mattermost и Plane"""
+    async def _transition(self, session: AsyncSession, ticket: Ticket, from_status: str, to_status: str) -> bool:
+        """
+        Переводит тикет в новый статус, только если он все еще в from_status.
+
+        UPDATE ... WHERE status = from_status блокирует строку, поэтому из
+        нескольких одновременных вызовов (в том числе на разных репликах)
+        переход выполнит ровно один. Изменение фиксирует вызывающий код.
+        """
+        changed = await session.scalar(
+            update(Ticket)
+            .where(Ticket.id == ticket.id, Ticket.status == from_status)
+            .values(status=to_status)
+            .returning(Ticket.id)
+        )
+        if changed is None:
+            await session.rollback()
+            await session.refresh(ticket)
+            return False
+        ticket.status = to_status
+        return True
+
+    async def activate_ticket(self, session: AsyncSession, ticket: Ticket) -> bool:
+        """
+        Активирует тикет и ставит в outbox его создание в Mattermost и Plane.
+
+        Треды в Mattermost и тикет в Plane создаются воркерами параллельно;
+        результат каждого сохраняется в тикете, а последующие сообщения тикета
+        доставляются только после них.
+
+        Returns:
+            bool: False, если тикет уже активирован другим вызовом (двойное
+            нажатие, повторная доставка callback) - тогда ничего не делается
+        """
         # Получаем пользователя для добавления его имени в заголовок
         user = await self.get_user_by_id(session, ticket.user_id)
         if not user:
@@ -143,28 +389,44 @@ class TicketService:
         # Формируем заголовок с полным именем пользователя
         full_title = f"#{ticket.id} {user.full_name}: {ticket.title}"
         
-        # Отправляем в Mattermost
-        thread_id = await self.mattermost_service.create_thread(
-            title=full_title,
-            message=ticket.description
-        )
+        # Задания создаются в той же транзакции, что и переход статуса
+        if not await self._transition(session, ticket, "pending", "active"):
+            return False
         
-        # Отправляем в Plane
-        plane_id = await self.plane_service.create_ticket(
-            title=full_title,
-            description=ticket.description
-        )
+        if not ticket.mattermost_post_id:
+            enqueue(session, ticket.id, LANE_MATTERMOST, "create_thread", {"title": full_title})
+        if not ticket.plane_ticket_id:
+            enqueue(session, ticket.id, LANE_PLANE, "create_issue", {"title": full_title})
         
-        # Обновляем статус тикета
-        ticket.status = "active"
-        ticket.mattermost_post_id = thread_id
-        ticket.plane_ticket_id = plane_id
         await session.commit()
+        outbox_worker.notify()
+        TICKETS_CREATED.inc()
+        await ticket_pages.invalidate(ticket.user_id)
+
+        await self._schedule_autoclose(ticket)
+        if settings.SLA_FIRST_RESPONSE_TIME:
+            await timer_wheel.schedule(
+                SLA, ticket.id,
+                datetime.utcnow() + timedelta(seconds=settings.SLA_FIRST_RESPONSE_TIME)
+            )
+        return True
+
+    async def cancel_ticket(self, session: AsyncSession, ticket: Ticket) -> bool:
+        """
+        Отменяет еще не подтвержденный тикет.
 
-    async def cancel_ticket(self, session: AsyncSession, ticket: Ticket) -> None:
-        """Отменяет тикет"""
-        ticket.status = "canceled"
+        Returns:
+            bool: False, если тикет уже подтвержден или отменен
+        """
+        # Внешние объекты создаются outbox только после активации, поэтому
+        # у неподтвержденного тикета удалять нечего
+        if not await self._transition(session, ticket, "pending", "canceled"):
+            return False
         await session.commit()
+        await ticket_pages.invalidate(ticket.user_id)
+        await timer_wheel.cancel(ticket.id)
+        await ticket_routes.set_status(ticket.mattermost_post_id, ticket.status)
+        return True
 
     async def add_message(self, session: AsyncSession, ticket: Ticket, message_text: str, is_from_user: bool = True) -> TicketMessage:
         """Добавляет сообщение к тикету"""
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, func, exists
+
+from bot.bot import bot
+from bot.config import settings
+from bot.database import async_session, redis
+from bot.models.models import Ticket, User, Message as TicketMessage
+from bot.services.outbox import enqueue, outbox_worker, LANE_MATTERMOST
+from bot.services.ticket_routes import ticket_routes
+from bot.services.ticket_pages import ticket_pages
+from bot.services.replica import replica_router
+
+logger = logging.getLogger(__name__)
+
+# Виды таймеров тикета
+AUTOCLOSE = "autoclose"
+SLA = "sla"
+
+TIMERS_KEY = "timers"
+# Отметка о том, что таймеры уже существующих тикетов однажды восстановлены из БД
+BACKFILL_KEY = "timers:backfilled"
+
+# Атомарно забирает сработавшие таймеры, продлевая их на время аренды:
+# если реплика упадет посреди обработки, таймер сработает повторно
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], member)
+end
+return due
+"""
+
+# Удаляет таймер, только если его не перепланировали во время обработки
+ACK_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+def _ms(at: datetime) -> int:
+    """Время (UTC, как в БД) в миллисекундах"""
+    return int((at - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+TimerHandler = Callable[[int], Awaitable[None]]
+
+class TimerWheel:
+    """
+    Таймеры тикетов в sorted set Redis (score - время срабатывания).
+
+    Каждая реплика раз в TIMER_POLL_INTERVAL забирает пачку сработавших
+    таймеров Lua-скриптом, поэтому один таймер обрабатывает одна реплика,
+    а таблицы тикетов при этом не сканируются. Таймеры хранятся в Redis
+    и переживают перезапуск приложения.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+        self._ack = redis.register_script(ACK_SCRIPT)
+        self._handlers: Dict[str, TimerHandler] = {
+            AUTOCLOSE: self._autoclose,
+            SLA: self._sla,
+        }
+
+    @staticmethod
+    def _member(kind: str, ticket_id: int) -> str:
+        return f"{kind}:{ticket_id}"
+
+    async def schedule(self, kind: str, ticket_id: int, at: datetime) -> None:
+        """Ставит или переносит таймер тикета"""
+        try:
+            await redis.zadd(TIMERS_KEY, {self._member(kind, ticket_id): _ms(at)})
+        except Exception as e:
+            # Без таймера тикет просто не закроется автоматически
+            logger.warning("Не удалось поставить таймер %s для тикета %s: %s", kind, ticket_id, e)
+
+    async def cancel(self, ticket_id: int, *kinds: str) -> None:
+        """Снимает таймеры тикета (по умолчанию все)"""
+        members = [self._member(kind, ticket_id) for kind in (kinds or self._handlers)]
+        try:
+            await redis.zrem(TIMERS_KEY, *members)
+        except Exception as e:
+            logger.warning("Не удалось снять таймеры тикета %s: %s", ticket_id, e)
+
+    async def start(self) -> None:
+        """Восстанавливает таймеры при первом запуске и начинает обработку"""
+        try:
+            await self._backfill()
+        except Exception as e:
+            # Отметка не поставлена - восстановление повторится при следующем запуске
+            logger.error("Не удалось восстановить таймеры тикетов: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _backfill(self) -> None:
+        """
+        Ставит таймеры активным тикетам, созданным до появления планировщика.
+
+        Выполняется один раз на Redis: отметка ставится только после
+        успешного восстановления, поэтому сбой повторит его при следующем
+        запуске. Тикетам, которые ждут первого ответа дольше
+        SLA_FIRST_RESPONSE_TIME, эскалация не ставится, чтобы первый запуск
+        не отправил по сообщению на каждый старый тикет. Закрытия давно
+        неактивных тикетов разносятся по времени на TIMER_BACKFILL_SPREAD.
+        """
+        if await redis.exists(BACKFILL_KEY):
+            return
+        now = datetime.utcnow()
+        async with async_session() as session:
+            rows = await session.execute(
+                select(
+                    Ticket.id,
+                    Ticket.created_at,
+                    func.greatest(Ticket.created_at, func.max(TicketMessage.created_at)),
+                    func.bool_or(TicketMessage.sender_type == "support")
+                )
+                .outerjoin(TicketMessage, TicketMessage.ticket_id == Ticket.id)
+                .where(Ticket.status == "active")
+                .group_by(Ticket.id)
+            )
+            rows = rows.all()
+
+        timers: Dict[str, int] = {}
+        overdue = 0
+        for ticket_id, created_at, last_activity, answered in rows:
+            last_activity = last_activity or now
+            if settings.TICKET_ACTIVE_TIME:
+                due = last_activity + timedelta(seconds=settings.TICKET_ACTIVE_TIME)
+                if due <= now:
+                    overdue += 1
+                    due = now + timedelta(seconds=random.uniform(0, settings.TIMER_BACKFILL_SPREAD))
+                timers[self._member(AUTOCLOSE, ticket_id)] = _ms(due)
+            if settings.SLA_FIRST_RESPONSE_TIME and not answered:
+                due = (created_at or now) + timedelta(seconds=settings.SLA_FIRST_RESPONSE_TIME)
+                if due > now:
+                    timers[self._member(SLA, ticket_id)] = _ms(due)
+
+        # В отличие от schedule, ошибки Redis здесь не глотаются: иначе
+        # отметка встала бы при потерянных таймерах
+        members = list(timers.items())
+        for start in range(0, len(members), 1000):
+            await redis.zadd(TIMERS_KEY, dict(members[start:start + 1000]))
+        await redis.set(BACKFILL_KEY, "1")
+        if overdue:
+            logger.info("Восстановлены таймеры: %s неактивных тикетов будут закрыты в течение %s с", overdue, settings.TIMER_BACKFILL_SPREAD)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                fired = await self._fire_due()
+            except Exception as e:
+                logger.error("Ошибка при обработке таймеров: %s", e)
+                fired = 0
+            # Полная пачка - вероятно, есть еще сработавшие таймеры
+            if fired < settings.TIMER_BATCH_SIZE:
+                await asyncio.sleep(settings.TIMER_POLL_INTERVAL)
+
+    async def _fire_due(self) -> int:
+        now = int(time.time() * 1000)
+        lease = now + settings.TIMER_LEASE_TIME * 1000
+        members: List[str] = await self._claim(keys=[TIMERS_KEY], args=[now, settings.TIMER_BATCH_SIZE, lease])
+        for member in members:
+            kind, ticket_id = member.split(":", 1)
+            try:
+                await self._handlers[kind](int(ticket_id))
+            except Exception as e:
+                # Таймер сработает еще раз после истечения аренды
+                logger.error("Таймер %s не обработан: %s", member, e)
+                continue
+            await self._ack(keys=[TIMERS_KEY], args=[member, lease])
+        return len(members)
+
+    async def _autoclose(self, ticket_id: int) -> None:
+        """Закрывает тикет без активности дольше TICKET_ACTIVE_TIME"""
+        async with async_session() as session:
+            ticket = await session.get(Ticket, ticket_id)
+            if not ticket or ticket.status != "active":
+                return
+
+            last_message = await session.scalar(
+                select(func.max(TicketMessage.created_at)).where(TicketMessage.ticket_id == ticket_id)
+            )
+            due = max(filter(None, [ticket.created_at, last_message])) + timedelta(seconds=settings.TICKET_ACTIVE_TIME)
+            if due > datetime.utcnow():
+                # Сообщение успело прийти раньше, чем таймер был перенесен
+                await self.schedule(AUTOCLOSE, ticket_id, due)
+                return
+
+            ticket.status = "closed"
+            ticket.closed_at = datetime.utcnow()
+            enqueue(session, ticket.id, LANE_MATTERMOST, "mattermost_notice", {
+                "message": "Заявка закрыта автоматически: нет активности."
+            })
+            await session.commit()
+            outbox_worker.notify()
+            await self.cancel(ticket_id, SLA)
+            await ticket_routes.set_status(ticket.mattermost_post_id, ticket.status)
+            await ticket_pages.invalidate(ticket.user_id)
+
+            user = await session.get(User, ticket.user_id)
+            if user:
+                # Иначе список заявок мог бы закэшироваться по отстающей реплике
+                await replica_router.mark_write(user.telegram_id)
+                await bot.send_message(
+                    chat_id=user.telegram_id,
+                    text=f"Заявка *{ticket.title}* закрыта, так как по ней не было активности. "
+                         "Если вопрос не решен, создайте новую заявку.",
+                    parse_mode="Markdown"
+                )
+
+    async def _sla(self, ticket_id: int) -> None:
+        """Эскалирует в Mattermost тикет без первого ответа поддержки"""
+        async with async_session() as session:
+            ticket = await session.get(Ticket, ticket_id)
+            if not ticket or ticket.status != "active":
+                return
+            answered = await session.scalar(
+                select(exists().where(
+                    TicketMessage.ticket_id == ticket_id,
+                    TicketMessage.sender_type == "support"
+                ))
+            )
+            if answered:
+                return
+            minutes = settings.SLA_FIRST_RESPONSE_TIME // 60
+            enqueue(session, ticket.id, LANE_MATTERMOST, "mattermost_notice", {
+                "message": f"{settings.SLA_ESCALATION_MENTION} Нет ответа по заявке #{ticket.id} больше {minutes} мин."
+            })
+            await session.commit()
+            outbox_worker.notify()
+
+# Общий планировщик
+timer_wheel = TimerWheel()
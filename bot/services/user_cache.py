@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from bot.config import settings
+from bot.database import redis
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class UserProfile:
+    """Компактный профиль пользователя для горячего пути обработки сообщений"""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    full_name: str
+    company: str
+    shop: str
+
+    @classmethod
+    def from_user(cls, user) -> "UserProfile":
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            username=user.username,
+            full_name=user.full_name,
+            company=user.company,
+            shop=user.shop
+        )
+
+class UserCache:
+    """
+    Read-through кэш профилей пользователей по telegram_id.
+
+    Первый уровень - словарь в памяти процесса с коротким TTL, второй - Redis.
+    Незарегистрированные пользователи кэшируются только в Redis (чтобы другие
+    реплики сразу увидели регистрацию), поэтому регистрация обязана вызвать invalidate().
+    """
+
+    def __init__(self):
+        self._local: Dict[int, Tuple[float, UserProfile]] = {}
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(telegram_id: int) -> str:
+        return f"user:tg:{telegram_id}"
+
+    def _set_local(self, telegram_id: int, profile: Optional[UserProfile]) -> None:
+        if profile is None:
+            return
+        if len(self._local) >= settings.USER_CACHE_LOCAL_SIZE:
+            # Простое вытеснение самой старой записи
+            self._local.pop(next(iter(self._local)))
+        self._local[telegram_id] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL, profile)
+
+    async def get(
+        self,
+        telegram_id: int,
+        loader: Callable[[int], Awaitable[Optional[UserProfile]]]
+    ) -> Optional[UserProfile]:
+        """Возвращает профиль из кэша, при промахе загружает его через loader"""
+        cached = self._local.get(telegram_id)
+        if cached and cached[0] > time.monotonic():
+            self.local_hits += 1
+            return cached[1]
+
+        try:
+            raw = await redis.get(self._key(telegram_id))
+        except Exception as e:
+            logger.warning("Redis недоступен для кэша пользователей: %s", e)
+            raw = None
+
+        if raw is not None:
+            self.redis_hits += 1
+            data = json.loads(raw)
+            profile = UserProfile(**data) if data else None
+            self._set_local(telegram_id, profile)
+            return profile
+
+        self.misses += 1
+        profile = await loader(telegram_id)
+        await self.set(telegram_id, profile)
+        return profile
+
+    async def set(self, telegram_id: int, profile: Optional[UserProfile]) -> None:
+        """Сохраняет профиль (или факт отсутствия пользователя) в кэш"""
+        self._set_local(telegram_id, profile)
+        ttl = settings.USER_CACHE_TTL if profile else settings.USER_CACHE_NEGATIVE_TTL
+        try:
+            await redis.set(self._key(telegram_id), json.dumps(asdict(profile) if profile else None), ex=ttl)
+        except Exception as e:
+            logger.warning("Не удалось сохранить профиль %s в Redis: %s", telegram_id, e)
+
+    async def invalidate(self, telegram_id: int) -> None:
+        """Удаляет профиль из кэша (после регистрации или изменения профиля)"""
+        self._local.pop(telegram_id, None)
+        try:
+            await redis.delete(self._key(telegram_id))
+        except Exception as e:
+            logger.warning("Не удалось удалить профиль %s из Redis: %s", telegram_id, e)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов"""
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_size": len(self._local),
+        }
+
+# Общий экземпляр кэша
+user_cache = UserCache()
@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+from bot.config import settings
+
+# Значения из настроек, которые не должны попадать в логи
+SECRET_SETTINGS = (
+    "BOT_TOKEN",
+    "POSTGRES_PASSWORD",
+    "REDIS_PASSWORD",
+    "MATTERMOST_TOKEN",
+    "MATTERMOST_WEBHOOK_TOKEN",
+    "PLANE_API_TOKEN",
+    "TELEGRAM_WEBHOOK_SECRET",
+    "ADMIN_API_TOKEN",
+)
+
+# Секреты, значения которых заранее неизвестны (заголовки и поля запросов)
+SECRET_PATTERNS = [
+    re.compile(r"(Bearer\s+)[^\s'\"]+", re.IGNORECASE),
+    re.compile(r"(['\"]?(?:token|secret|password|X-API-Key|Authorization)['\"]?\s*[:=]\s*['\"]?)[^'\"\s,}]+", re.IGNORECASE),
+]
+
+REDACTED = "***"
+
+class NonFormattingQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный QueueHandler вызывает format() до постановки в очередь;
+    здесь подстановка аргументов, редактирование секретов и сериализация
+    выполняются в фоновом потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю DEBUG-записей, остальные уровни не трогает"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+_exception_formatter = logging.Formatter()
+
+class RedactingFilter(logging.Filter):
+    """Заменяет секреты в тексте записи на ***"""
+
+    def __init__(self, secrets: List[str]):
+        super().__init__()
+        # Длинные значения первыми, чтобы не оставлять хвостов
+        self.secrets = sorted((s for s in secrets if s and len(s) >= 4), key=len, reverse=True)
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, REDACTED)
+        for pattern in SECRET_PATTERNS:
+            text = pattern.sub(lambda m: m.group(1) + REDACTED, text)
+        return text
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        # Форматтеры берут уже готовый exc_text, поэтому трейсбек
+        # (в том числе текст исключения) редактируется здесь же
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = self.redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = self.redact(record.stack_info)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна JSON-строка"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False)
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging() -> None:
+    """
+    Настраивает неблокирующий вывод логов.
+
+    Обработчики в коде только кладут запись в очередь; вывод, форматирование
+    и редактирование секретов выполняет фоновый поток.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    stream_handler.addFilter(RedactingFilter([getattr(settings, name) for name in SECRET_SETTINGS]))
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = NonFormattingQueueHandler(log_queue)
+    # Выборка выполняется до постановки в очередь, чтобы отброшенные записи ничего не стоили
+    queue_handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    # Логи uvicorn идут через тот же конвейер
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers[:] = []
+        logging.getLogger(name).propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Дописывает накопленные записи и останавливает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
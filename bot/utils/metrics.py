@@ -0,0 +1,89 @@
+import functools
+import os
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+# Границы корзин в секундах: от быстрых запросов к БД до медленных внешних API
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds",
+    "Время обработки обновления Telegram обработчиком aiogram",
+    ["handler"],
+    buckets=LATENCY_BUCKETS,
+)
+EXTERNAL_CALL_LATENCY = Histogram(
+    "bot_external_call_duration_seconds",
+    "Время вызова внешнего API",
+    ["service", "operation", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "bot_db_query_duration_seconds",
+    "Время выполнения SQL-запроса",
+    ["statement"],
+    buckets=LATENCY_BUCKETS,
+)
+WEBHOOK_LATENCY = Histogram(
+    "bot_mattermost_webhook_duration_seconds",
+    "Время обработки вебхука Mattermost: ответ на запрос (ack) и фоновая обработка (process)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TICKETS_CREATED = Counter(
+    "bot_tickets_created_total",
+    "Активированные тикеты",
+)
+MESSAGES_RELAYED = Counter(
+    "bot_messages_relayed_total",
+    "Пересланные сообщения: to_support (из Telegram) и to_user (из Mattermost)",
+    ["direction"],
+)
+ERRORS = Counter(
+    "bot_errors_total",
+    "Ошибки по компонентам",
+    ["component"],
+)
+
+T = TypeVar("T")
+
+def observe_call(service: str, operation: str, none_is_error: bool = False):
+    """
+    Декоратор для методов внешних сервисов: пишет время вызова с меткой статуса
+
+    Args:
+        service: Название сервиса (plane, mattermost)
+        operation: Название операции
+        none_is_error: Считать ошибкой результат None (для методов, которые не бросают исключений)
+    """
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = await func(*args, **kwargs)
+                status = "error" if none_is_error and result is None else "ok"
+                return result
+            finally:
+                EXTERNAL_CALL_LATENCY.labels(service, operation, status).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def render_metrics() -> bytes:
+    """Формирует ответ для /metrics (с учетом нескольких процессов uvicorn)"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,50 @@
+"""add_outbox_jobs
+
+Revision ID: 26cc9033e9a0
+Revises: 24a7d3ccb336
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '26cc9033e9a0'
+down_revision: Union[str, None] = '24a7d3ccb336'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('outbox_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('lane', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Частичный индекс только по невыполненным заданиям
+    op.create_index(
+        'ix_outbox_jobs_pending',
+        'outbox_jobs',
+        ['ticket_id', 'lane', 'id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_jobs_pending', table_name='outbox_jobs')
+    op.drop_table('outbox_jobs')
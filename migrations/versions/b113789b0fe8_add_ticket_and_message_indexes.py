@@ -0,0 +1,62 @@
+"""add_ticket_and_message_indexes
+
+Revision ID: b113789b0fe8
+Revises: 26cc9033e9a0
+Create Date: 2026-10-17 12:04:55.902611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b113789b0fe8'
+down_revision: Union[str, None] = '26cc9033e9a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в рабочие таблицы
+    with op.get_context().autocommit_block():
+        # get_last_ticket и сортировка списков тикетов пользователя
+        op.create_index(
+            'ix_tickets_user_id_created_at',
+            'tickets',
+            ['user_id', sa.text('created_at DESC')],
+            postgresql_concurrently=True
+        )
+        # get_active_tickets: незакрытые тикеты пользователя
+        op.create_index(
+            'ix_tickets_user_id_created_at_open',
+            'tickets',
+            ['user_id', sa.text('created_at DESC')],
+            postgresql_where=sa.text("status <> 'closed'"),
+            postgresql_concurrently=True
+        )
+        # Поиск тикета по треду Mattermost при каждом вебхуке
+        op.create_index(
+            'ix_tickets_mattermost_post_id',
+            'tickets',
+            ['mattermost_post_id'],
+            postgresql_where=sa.text("mattermost_post_id IS NOT NULL"),
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_messages_ticket_id_created_at',
+            'messages',
+            ['ticket_id', 'created_at'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_ticket_id_created_at', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_tickets_mattermost_post_id', table_name='tickets', postgresql_concurrently=True)
+        op.drop_index('ix_tickets_user_id_created_at_open', table_name='tickets', postgresql_concurrently=True)
+        op.drop_index('ix_tickets_user_id_created_at', table_name='tickets', postgresql_concurrently=True)
@@ -0,0 +1,49 @@
+"""add_attachments
+
+Revision ID: c3e8a91d4f27
+Revises: b645216a3570
+Create Date: 2026-10-17 16:02:41.532107
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a91d4f27'
+down_revision: Union[str, None] = 'b645216a3570'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attachments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('file_unique_id', sa.String(), nullable=True),
+        sa.Column('telegram_file_id', sa.String(), nullable=True),
+        sa.Column('mattermost_file_id', sa.String(), nullable=True),
+        sa.Column('plane_asset_id', sa.String(), nullable=True),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_attachments_message_id', 'attachments', ['message_id'])
+    op.create_index('ix_attachments_ticket_id_file_unique_id', 'attachments', ['ticket_id', 'file_unique_id'])
+    op.create_index('ix_attachments_mattermost_file_id', 'attachments', ['mattermost_file_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_attachments_mattermost_file_id', table_name='attachments')
+    op.drop_index('ix_attachments_ticket_id_file_unique_id', table_name='attachments')
+    op.drop_index('ix_attachments_message_id', table_name='attachments')
+    op.drop_table('attachments')
@@ -0,0 +1,46 @@
+"""add_tickets_keyset_index
+
+Revision ID: d5f19b7e3a60
+Revises: c3e8a91d4f27
+Create Date: 2026-10-17 17:38:12.640219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f19b7e3a60'
+down_revision: Union[str, None] = 'c3e8a91d4f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        # Постраничный список незакрытых тикетов пользователя (keyset по created_at, id)
+        op.create_index(
+            'ix_tickets_user_id_created_at_id_open',
+            'tickets',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_where=sa.text("status <> 'closed'"),
+            postgresql_concurrently=True
+        )
+        # Новый индекс покрывает и прежний запрос get_active_tickets
+        op.drop_index('ix_tickets_user_id_created_at_open', table_name='tickets', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tickets_user_id_created_at_open',
+            'tickets',
+            ['user_id', sa.text('created_at DESC')],
+            postgresql_where=sa.text("status <> 'closed'"),
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_tickets_user_id_created_at_id_open', table_name='tickets', postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""add_messages_keyset_index
+
+Revision ID: e82c4d0a9b13
+Revises: d5f19b7e3a60
+Create Date: 2026-10-17 18:15:47.208356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e82c4d0a9b13'
+down_revision: Union[str, None] = 'd5f19b7e3a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        # История тикета (keyset по created_at, id) и время последнего сообщения
+        op.create_index(
+            'ix_messages_ticket_id_created_at_id',
+            'messages',
+            ['ticket_id', 'created_at', 'id'],
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_messages_ticket_id_created_at', table_name='messages', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_ticket_id_created_at',
+            'messages',
+            ['ticket_id', 'created_at'],
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_messages_ticket_id_created_at_id', table_name='messages', postgresql_concurrently=True)
@@ -0,0 +1,107 @@
+"""add_full_text_search
+
+Revision ID: f4b7c2e91d58
+Revises: e82c4d0a9b13
+Create Date: 2026-10-17 19:02:33.815470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b7c2e91d58'
+down_revision: Union[str, None] = 'e82c4d0a9b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Размер пачки при заполнении search_vector для уже существующих строк
+BACKFILL_BATCH = 5000
+
+TICKETS_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+)
+MESSAGES_VECTOR = "to_tsvector('russian', coalesce(content, ''))"
+
+
+def _backfill(table: str, vector: str) -> None:
+    """Заполняет search_vector короткими транзакциями, не блокируя таблицу целиком"""
+    bind = op.get_bind()
+    while True:
+        result = bind.execute(sa.text(
+            f"UPDATE {table} SET search_vector = {vector} "
+            f"WHERE id IN (SELECT id FROM {table} WHERE search_vector IS NULL LIMIT {BACKFILL_BATCH})"
+        ))
+        if result.rowcount < BACKFILL_BATCH:
+            break
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tickets', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.add_column('messages', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Новые и измененные строки индексируются триггерами
+    op.execute("""
+        CREATE OR REPLACE FUNCTION tickets_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER tickets_search_vector_update
+            BEFORE INSERT OR UPDATE OF title, description ON tickets
+            FOR EACH ROW EXECUTE FUNCTION tickets_search_vector_update()
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := to_tsvector('russian', coalesce(NEW.content, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER messages_search_vector_update
+            BEFORE INSERT OR UPDATE OF content ON messages
+            FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()
+    """)
+
+    with op.get_context().autocommit_block():
+        _backfill('tickets', TICKETS_VECTOR)
+        _backfill('messages', MESSAGES_VECTOR)
+        op.create_index(
+            'ix_tickets_search_vector',
+            'tickets',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_messages_search_vector',
+            'messages',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_tickets_search_vector', table_name='tickets', postgresql_concurrently=True)
+    op.execute("DROP TRIGGER IF EXISTS messages_search_vector_update ON messages")
+    op.execute("DROP TRIGGER IF EXISTS tickets_search_vector_update ON tickets")
+    op.execute("DROP FUNCTION IF EXISTS messages_search_vector_update()")
+    op.execute("DROP FUNCTION IF EXISTS tickets_search_vector_update()")
+    op.drop_column('messages', 'search_vector')
+    op.drop_column('tickets', 'search_vector')
@@ -8,8 +8,8 @@ from typing import Any
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot"))
 
 from bot.main import app, shutdown_event
+from bot.config import settings
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def handle_exit(signum, frame):
@@ -23,12 +23,18 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, handle_exit)
     signal.signal(signal.SIGTERM, handle_exit)
     
+    # Несколько процессов возможны только в режиме webhook:
+    # при поллинге обновления получает единственный процесс
+    workers = settings.WEB_WORKERS if settings.TELEGRAM_MODE == "webhook" else 1
+    
     # Запускаем с помощью uvicorn напрямую
     uvicorn.run(
-        app,
+        "bot.main:app" if workers > 1 else app,
+        workers=workers,
         host="0.0.0.0",
         port=8000,
         log_level="info",
+        log_config=None,  # Логи uvicorn идут через общий конвейер (bot.utils.log)
         use_colors=True,
         loop="asyncio"
     )
\ No newline at end of file
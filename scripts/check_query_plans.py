@@ -0,0 +1,166 @@
+"""
+Проверка планов горячих запросов к tickets и messages.
+
+Запускается против локального PostgreSQL со схемой, приведенной к последней
+миграции (alembic upgrade head). Скрипт в одной транзакции заполняет таблицы
+синтетическими данными, выполняет ANALYZE и EXPLAIN для каждого запроса,
+после чего откатывает транзакцию. Если хотя бы один запрос выполняется
+последовательным сканированием tickets или messages, скрипт завершается
+с ненулевым кодом. Та же проверка выполняется в CI как
+tests/test_query_plans.py.
+
+    python scripts/check_query_plans.py
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text, tuple_, func, literal_column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from bot.models.models import Ticket, Message
+
+USERS = 5000
+TICKETS_PER_USER = 20
+MESSAGES_PER_TICKET = 3
+
+# Таблицы, последовательное сканирование которых считается регрессией
+WATCHED_TABLES = {"tickets", "messages"}
+
+# Те же запросы, что выполняет TicketService на горячем пути
+HOT_QUERIES = {
+    "get_active_tickets": (
+        select(Ticket)
+        .where(Ticket.user_id == 42, Ticket.status != 'closed')
+        .order_by(Ticket.created_at.desc())
+    ),
+    "get_tickets_page": (
+        select(Ticket.id, Ticket.title, Ticket.status, Ticket.created_at)
+        .where(
+            Ticket.user_id == 42,
+            Ticket.status != 'closed',
+            tuple_(Ticket.created_at, Ticket.id) < (datetime(2026, 1, 1), 4242)
+        )
+        .order_by(Ticket.created_at.desc(), Ticket.id.desc())
+        .limit(11)
+    ),
+    "get_last_ticket": (
+        select(Ticket)
+        .where(Ticket.user_id == 42)
+        .order_by(Ticket.created_at.desc())
+        .limit(1)
+    ),
+    "get_ticket_by_mattermost_post_id": (
+        select(Ticket).where(Ticket.mattermost_post_id == "post-4242")
+    ),
+    "get_messages_page": (
+        select(Message.id, Message.sender_type, Message.content, Message.created_at)
+        .where(
+            Message.ticket_id == 4242,
+            tuple_(Message.created_at, Message.id) > (datetime(2026, 1, 1), 4242)
+        )
+        .order_by(Message.created_at, Message.id)
+        .limit(31)
+    ),
+    "search_tickets": (
+        select(Ticket.id)
+        .where(Ticket.search_vector.op("@@")(func.websearch_to_tsquery(literal_column("'russian'"), "Ticket 4242")))
+    ),
+    "search_messages": (
+        select(Message.ticket_id)
+        .where(Message.search_vector.op("@@")(func.websearch_to_tsquery(literal_column("'russian'"), "Message 3")))
+    ),
+    "ticket_messages": (
+        select(Message)
+        .where(Message.ticket_id == 4242)
+        .order_by(Message.created_at)
+    ),
+}
+
+SEED_SQL = [
+    f"""
+    INSERT INTO users (telegram_id, full_name, company, shop, registered_at, is_active)
+    SELECT 1000000000 + n, 'User ' || n, 'Company ' || (n % 50), 'Shop ' || (n % 500), now(), true
+    FROM generate_series(1, {USERS}) AS n
+    """,
+    f"""
+    INSERT INTO tickets (user_id, title, description, status, mattermost_post_id, plane_ticket_id, created_at)
+    SELECT u.id, 'Ticket ' || n, 'Description ' || n,
+           (ARRAY['pending', 'active', 'closed', 'canceled'])[1 + n % 4],
+           'post-' || u.id || '-' || n, 'plane-' || u.id || '-' || n,
+           now() - (n || ' minutes')::interval
+    FROM users u, generate_series(1, {TICKETS_PER_USER}) AS n
+    WHERE u.telegram_id > 1000000000
+    """,
+    f"""
+    INSERT INTO messages (ticket_id, sender_type, content, created_at)
+    SELECT t.id, 'user', 'Message ' || n, t.created_at + (n || ' seconds')::interval
+    FROM tickets t, generate_series(1, {MESSAGES_PER_TICKET}) AS n
+    """,
+    "ANALYZE users",
+    "ANALYZE tickets",
+    "ANALYZE messages",
+]
+
+def find_seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Возвращает таблицы из WATCHED_TABLES, которые план читает последовательно"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in WATCHED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+async def explain_hot_queries(database_url: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Заполняет БД синтетическими данными и возвращает план каждого запроса
+    из HOT_QUERIES; все изменения откатываются
+    """
+    engine = create_async_engine(database_url)
+    plans = {}
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                for statement in SEED_SQL:
+                    await conn.execute(text(statement))
+                for name, query in HOT_QUERIES.items():
+                    plans[name] = await explain(conn, query)
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+    return plans
+
+async def explain(conn: AsyncConnection, query) -> Dict[str, Any]:
+    """Возвращает корневой узел плана запроса"""
+    compiled = query.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True}
+    )
+    result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+    raw = result.scalar()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+async def main() -> int:
+    from bot.database import DATABASE_URL
+
+    failures = 0
+    for name, plan in (await explain_hot_queries(DATABASE_URL)).items():
+        seq_scans = find_seq_scans(plan)
+        if seq_scans:
+            failures += 1
+            print(f"FAIL {name}: Seq Scan on {', '.join(seq_scans)}")
+            print(json.dumps(plan, indent=2))
+        else:
+            print(f"ok   {name}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))